@@ -0,0 +1,369 @@
+"""
+Historical backfill: replay archived raw provider payloads through the filter,
+cluster and categorise stages without calling the live news APIs.
+
+Payloads are read from the layout written by data_extraction.archive_payload:
+    <archive_dir>/<YYYY-MM-DD>/<provider>/<key>.json
+
+Each processed day is written to <output_dir>/<YYYY-MM-DD>.json. A day whose
+output file already exists is skipped, so an interrupted run can be resumed by
+running the same command again. The day file keeps Gemini's reply for every
+article, and articles whose call failed are listed with their attempt count. On
+the next run only those articles are sent again, each at most --max-attempts
+times in total, so an article Gemini always refuses can't keep a day open.
+
+Each worker waits --llm-delay seconds between Gemini calls, so the overall call
+rate is roughly workers / llm-delay per second.
+
+Workers return Gemini's raw category labels. The parent process merges them into
+the shared category taxonomy (see taxonomy.py), so every day uses the same buckets.
+
+Usage:
+    python backfill.py 2025-01-01 2025-01-31 --workers 4 --batch-size 8
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from data_extraction import ARCHIVE_DIR, PAYLOAD_PARSERS
+from data_formatting import filter_english_articles_and_duplicate, consolidate_dataframe
+from clustering import EnhancedArticleClusterer, request_categories, canonicalise_categories
+from taxonomy import CategoryTaxonomy
+from memory_budget import MB, PeakRss
+from config import get_env
+
+BACKFILL_LLM_DELAY = float(get_env("BACKFILL_LLM_DELAY", "3"))
+BACKFILL_MAX_ATTEMPTS = int(get_env("BACKFILL_MAX_ATTEMPTS", "3"))
+
+
+def date_range(start, end):
+    """Yield every date from start to end inclusive."""
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def load_archived_articles(day, archive_dir):
+    """
+    Parse every archived payload for a day.
+
+    Args:
+        day (date): Day to load.
+        archive_dir (str): Root archive directory.
+
+    Returns:
+        dict: Provider name -> list of article dicts.
+    """
+    articles = {provider: [] for provider in PAYLOAD_PARSERS}
+    day_dir = os.path.join(archive_dir, day.isoformat())
+
+    for provider, parser in PAYLOAD_PARSERS.items():
+        provider_dir = os.path.join(day_dir, provider)
+        if not os.path.isdir(provider_dir):
+            continue
+
+        for file_name in sorted(os.listdir(provider_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(provider_dir, file_name), encoding="utf-8") as f:
+                    articles[provider].extend(parser(json.load(f)))
+            except (OSError, ValueError) as e:
+                print(f"[{day}] Skipping unreadable payload {provider}/{file_name}: {e}")
+
+    return articles
+
+
+def output_path(day, output_dir):
+    return os.path.join(output_dir, f"{day.isoformat()}.json")
+
+
+def load_day(day, output_dir):
+    """The output previously written for a day, or None if there is none."""
+    try:
+        with open(output_path(day, output_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def retryable(previous, max_attempts):
+    """Failed articles of a previously written day that still have attempts left."""
+    return [article for article in previous.get("failed", [])
+            if article["attempts"] < max_attempts]
+
+
+def failed_entries(articles, attempts_before=None):
+    """Day-file records for articles whose Gemini call failed."""
+    attempts_before = attempts_before or {}
+    return [{
+        "title": article["title"],
+        "description": article["description"],
+        "attempts": attempts_before.get((article["title"], article["description"]), 0) + 1,
+    } for article in articles]
+
+
+def process_day(day, archive_dir, categorise=True, memory_budget_mb=None,
+                llm_delay=BACKFILL_LLM_DELAY):
+    """
+    Run one archived day through the filter, cluster and categorise stages.
+
+    Category labels are returned as Gemini gave them; the parent process merges
+    them into one shared taxonomy (see write_day) so every day uses the same buckets.
+
+    Args:
+        day (date): Day to process.
+        archive_dir (str): Root archive directory.
+        categorise (bool): If False, stop after clustering (no LLM calls).
+        memory_budget_mb (float): Cluster out of core within this budget
+            (defaults to the MEMORY_BUDGET_MB env variable).
+        llm_delay (float): Seconds this worker waits between Gemini calls.
+
+    Returns:
+        dict: The day, article counts, clusters, raw Gemini responses, the
+        articles whose call failed, elapsed seconds and the worker's peak RSS in
+        MB while processing the day (None where unavailable).
+    """
+    started = time.perf_counter()
+    # Workers are reused across days, so measure this day's own peak
+    with PeakRss() as rss:
+        raw = load_archived_articles(day, archive_dir)
+
+        full_articles_database = consolidate_dataframe(
+            filter_english_articles_and_duplicate(raw["newsapi"]),
+            filter_english_articles_and_duplicate(raw["newsio"]),
+            filter_english_articles_and_duplicate(raw["gnews"])
+        )
+
+        clusterer = EnhancedArticleClusterer(n_clusters='auto', method='kmeans',
+                                             category_weight=3, memory_budget_mb=memory_budget_mb)
+        clusters = clusterer.cluster_articles(full_articles_database)
+
+        responses = []
+        failed = []
+        if categorise and full_articles_database:
+            responses, failed = request_categories(full_articles_database, delay=llm_delay)
+
+    return {
+        "day": day.isoformat(),
+        "raw_articles": sum(len(v) for v in raw.values()),
+        "articles": len(full_articles_database),
+        "clusters": clusters,
+        "responses": responses,
+        "failed": failed_entries(failed),
+        "seconds": time.perf_counter() - started,
+        "peak_rss_mb": round(rss.peak_bytes / MB) if rss.peak_bytes else None,
+    }
+
+
+def retry_day(previous, max_attempts=BACKFILL_MAX_ATTEMPTS, llm_delay=BACKFILL_LLM_DELAY):
+    """
+    Re-send only the failed articles of a previously written day to Gemini.
+
+    Args:
+        previous (dict): The day's output file as written by write_day.
+        max_attempts (int): Articles already tried this many times are not sent again.
+        llm_delay (float): Seconds this worker waits between Gemini calls.
+
+    Returns:
+        dict: Same shape as process_day, with the new replies added to the
+        earlier ones and attempt counts raised for articles that failed again.
+    """
+    started = time.perf_counter()
+    retry = retryable(previous, max_attempts)
+    attempts_before = {(a["title"], a["description"]): a["attempts"] for a in retry}
+    given_up = [a for a in previous["failed"] if a["attempts"] >= max_attempts]
+
+    with PeakRss() as rss:
+        responses, failed = request_categories(retry, delay=llm_delay)
+
+    return {
+        "day": previous["day"],
+        "raw_articles": previous["raw_articles"],
+        "articles": previous["articles"],
+        "clusters": previous["clusters"],
+        "responses": previous["responses"] + responses,
+        "failed": given_up + failed_entries(failed, attempts_before),
+        "seconds": time.perf_counter() - started,
+        "peak_rss_mb": round(rss.peak_bytes / MB) if rss.peak_bytes else None,
+    }
+
+
+def write_day(processed, taxonomy, output_dir, max_attempts=BACKFILL_MAX_ATTEMPTS):
+    """
+    Canonicalise a processed day's categories and write its output file.
+
+    Args:
+        processed (dict): Output of process_day or retry_day.
+        taxonomy (CategoryTaxonomy): Taxonomy shared by every day of the backfill.
+        output_dir (str): Directory the day's results are written to.
+        max_attempts (int): Attempts after which a failed article is given up on.
+
+    Returns:
+        dict: Summary with the day, article counts, failed categorisations (and
+        how many of them are still retryable), elapsed seconds and peak RSS.
+    """
+    result = {
+        "day": processed["day"],
+        "raw_articles": processed["raw_articles"],
+        "articles": processed["articles"],
+        "clusters": processed["clusters"],
+        "categorised": canonicalise_categories(processed["responses"], taxonomy),
+        # Raw replies are kept so a resumed run only has to ask about the failed articles
+        "responses": processed["responses"],
+        "failed": processed["failed"],
+        "failed_categorisations": len(processed["failed"]),
+    }
+
+    # Write atomically so a half-written file never counts as a finished day
+    path = output_path(date.fromisoformat(processed["day"]), output_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+    summary = {key: processed[key] for key in
+               ("day", "raw_articles", "articles", "seconds", "peak_rss_mb")}
+    summary["failed_categorisations"] = result["failed_categorisations"]
+    summary["retryable"] = len(retryable(result, max_attempts))
+    return summary
+
+
+def run_backfill(start, end, archive_dir=None, output_dir="backfill_output",
+                 workers=None, batch_size=8, categorise=True, resume=True,
+                 memory_budget_mb=None, llm_delay=BACKFILL_LLM_DELAY,
+                 max_attempts=BACKFILL_MAX_ATTEMPTS):
+    """
+    Reprocess a date range of archived payloads in parallel batches.
+
+    Args:
+        start (date): First day (inclusive).
+        end (date): Last day (inclusive).
+        archive_dir (str): Root archive directory (defaults to ARCHIVE_DIR env variable).
+        output_dir (str): Where per-day results are written.
+        workers (int): Number of worker processes (defaults to CPU count).
+        batch_size (int): Number of days submitted to the pool at a time.
+        categorise (bool): Whether to run the LLM categorisation stage.
+        resume (bool): Skip days that already have output, apart from re-sending
+            their failed articles.
+        memory_budget_mb (float): Per-worker clustering memory budget in MB.
+        llm_delay (float): Seconds each worker waits between Gemini calls.
+        max_attempts (int): Gemini calls made for one article before giving up on it.
+
+    Returns:
+        list of dict: Per-day summaries for the days processed in this run.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR or "archive"
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Day -> its earlier output if only failed articles need re-sending, else None
+    days = {}
+    for day in date_range(start, end):
+        if not os.path.isdir(os.path.join(archive_dir, day.isoformat())):
+            continue
+        previous = load_day(day, output_dir) if resume else None
+        if previous is None:
+            days[day] = None
+        elif "failed" not in previous:
+            # Written before per-article failures were recorded
+            if previous.get("failed_categorisations"):
+                days[day] = None
+        elif retryable(previous, max_attempts):
+            days[day] = previous
+    if not days:
+        print("Nothing to backfill.")
+        return []
+
+    retries = sum(previous is not None for previous in days.values())
+    print(f"Backfilling {len(days)} day(s) ({retries} only re-sending failed articles) "
+          f"from {archive_dir} into {output_dir}")
+    # One taxonomy for the whole run, only touched by this process, so workers can't
+    # name the same topic differently on different days
+    taxonomy = CategoryTaxonomy()
+    summaries = []
+    total_articles = 0
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        ordered = sorted(days)
+        for offset in range(0, len(ordered), batch_size):
+            futures = {}
+            for day in ordered[offset:offset + batch_size]:
+                if days[day] is None:
+                    futures[day] = pool.submit(process_day, day, archive_dir, categorise,
+                                               memory_budget_mb, llm_delay)
+                else:
+                    futures[day] = pool.submit(retry_day, days[day], max_attempts, llm_delay)
+
+            for day, future in futures.items():
+                try:
+                    summary = write_day(future.result(), taxonomy, output_dir, max_attempts)
+                except Exception as e:
+                    print(f"[{day}] Failed: {e}")
+                    continue
+
+                summaries.append(summary)
+                total_articles += summary["articles"]
+                given_up = summary["failed_categorisations"] - summary["retryable"]
+                if summary["retryable"]:
+                    print(f"[{day}] {summary['retryable']} categorisation(s) failed; "
+                          f"they will be re-sent on the next run")
+                if given_up:
+                    print(f"[{day}] {given_up} article(s) left uncategorised "
+                          f"after {max_attempts} attempts")
+                elapsed = time.perf_counter() - started
+                memory = f", worker peak RSS {summary['peak_rss_mb']} MB" if summary["peak_rss_mb"] else ""
+                print(f"[{len(summaries)}/{len(days)}] {summary['day']}: "
+                      f"{summary['articles']}/{summary['raw_articles']} articles kept "
+                      f"in {summary['seconds']:.1f}s "
+                      f"({total_articles / elapsed:.1f} articles/s overall{memory})")
+
+            # Saved per batch so a resumed run keeps the buckets earlier days used
+            taxonomy.save()
+
+    elapsed = time.perf_counter() - started
+    print(f"Backfilled {len(summaries)} day(s), {total_articles} articles in {elapsed:.1f}s")
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay archived provider payloads.")
+    parser.add_argument("start", type=date.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument("end", type=date.fromisoformat, help="Last day, YYYY-MM-DD")
+    parser.add_argument("--archive-dir", default=None)
+    parser.add_argument("--output-dir", default="backfill_output")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--no-categorise", action="store_true",
+                        help="Skip the Gemini categorisation stage")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Reprocess days that already have output")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="Cluster out of core within this many MB per worker")
+    parser.add_argument("--llm-delay", type=float, default=BACKFILL_LLM_DELAY,
+                        help="Seconds each worker waits between Gemini calls")
+    parser.add_argument("--max-attempts", type=int, default=BACKFILL_MAX_ATTEMPTS,
+                        help="Gemini calls made for one article before giving up on it")
+    args = parser.parse_args()
+
+    run_backfill(
+        args.start, args.end,
+        archive_dir=args.archive_dir,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        categorise=not args.no_categorise,
+        resume=not args.no_resume,
+        memory_budget_mb=args.memory_budget_mb,
+        llm_delay=args.llm_delay,
+        max_attempts=args.max_attempts,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Exercise SMTPDelivery against a local stand-in SMTP server (aiosmtpd).
+
+The server refuses some recipients permanently (550) and some temporarily (450),
+and the checks assert that batching, queueing of temporary failures in the
+outbox, dropping of permanent refusals and flush_outbox behave as documented.
+
+Usage:
+    pip install aiosmtpd
+    python check_email_delivery.py
+"""
+
+import json
+import logging
+import os
+import socket
+import tempfile
+
+from aiosmtpd.controller import Controller
+
+from email_delivery import SMTPDelivery, build_digest_message
+
+
+class StandInHandler:
+    """
+    Addresses at gone.example are refused with 550, addresses at busy.example
+    with 450 while `busy` is set; everything else is accepted.
+    """
+
+    def __init__(self):
+        self.busy = True
+        self.connections = 0
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        domain = address.rsplit("@", 1)[-1]
+        if domain == "gone.example":
+            return "550 5.1.1 No such mailbox"
+        if domain == "busy.example" and self.busy:
+            return "450 4.2.1 Mailbox busy, try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(list(envelope.rcpt_tos))
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_delivery(port, outbox_dir, **overrides):
+    options = dict(from_email="digest@example.com", password="", host="127.0.0.1", port=port,
+                   use_ssl=False, outbox_dir=outbox_dir)
+    options.update(overrides)
+    return SMTPDelivery(**options)
+
+
+def outbox_entries(outbox_dir):
+    entries = []
+    if os.path.isdir(outbox_dir):
+        for file_name in sorted(os.listdir(outbox_dir)):
+            if file_name.endswith(".json"):
+                with open(os.path.join(outbox_dir, file_name), encoding="utf-8") as f:
+                    entries.append(json.load(f))
+    return entries
+
+
+MESSAGE = build_digest_message("<p>Digest</p>", "digest@example.com")
+
+
+def check_batching(handler, port, outbox_dir):
+    recipients = [f"reader{i}@ok.example" for i in range(7)]
+    with make_delivery(port, outbox_dir, batch_size=3) as delivery:
+        result = delivery.send(MESSAGE, recipients)
+
+    return {
+        "recipients are sent in batches of batch_size":
+            [len(batch) for batch in handler.messages] == [3, 3, 1],
+        "every batch goes over one connection": handler.connections == 1,
+        "every recipient is delivered": result["sent"] == 7 and result["queued"] == 0,
+    }
+
+
+def check_refusals(handler, port, outbox_dir):
+    recipients = ["a@ok.example", "b@gone.example", "c@busy.example", "d@ok.example"]
+    with make_delivery(port, outbox_dir) as delivery:
+        result = delivery.send(MESSAGE, recipients)
+
+    return {
+        "accepted recipients get the message": handler.messages == [["a@ok.example", "d@ok.example"]],
+        "a 450 refusal is queued and a 550 refusal is dropped":
+            (result["sent"], result["queued"], result["rejected"]) == (2, 1, 1)
+            and outbox_entries(outbox_dir) == [{"recipients": ["c@busy.example"], "attempts": 0}],
+    }
+
+
+def check_all_refused(handler, port, outbox_dir):
+    with make_delivery(port, outbox_dir) as delivery:
+        result = delivery.send(MESSAGE, ["x@gone.example", "y@busy.example"])
+
+    return {
+        "a batch with every recipient refused still sorts 4xx from 5xx":
+            (result["sent"], result["queued"], result["rejected"]) == (0, 1, 1)
+            and outbox_entries(outbox_dir) == [{"recipients": ["y@busy.example"], "attempts": 0}],
+    }
+
+
+def check_no_reply(handler, port, outbox_dir):
+    # Nothing listens on this port, so the failure comes with no SMTP reply at all
+    with make_delivery(free_port(), outbox_dir) as delivery:
+        result = delivery.send(MESSAGE, ["p@ok.example", "q@ok.example"])
+
+    return {
+        "a connection failure queues the whole batch":
+            result["queued"] == 2
+            and outbox_entries(outbox_dir) == [{"recipients": ["p@ok.example", "q@ok.example"],
+                                                "attempts": 0}],
+    }
+
+
+def check_flush(handler, port, outbox_dir):
+    with make_delivery(port, outbox_dir) as delivery:
+        delivery.queue(MESSAGE, ["r@ok.example", "s@busy.example", "t@gone.example"])
+
+        still_busy = delivery.flush_outbox()
+        kept = outbox_entries(outbox_dir)
+
+        handler.busy = False
+        recovered = delivery.flush_outbox()
+
+    return {
+        "flush delivers what it can, keeps 4xx refusals and drops 5xx ones":
+            still_busy == 1 and kept == [{"recipients": ["s@busy.example"], "attempts": 1}],
+        "flush delivers the rest once the mailbox accepts and empties the outbox":
+            recovered == 1 and not os.listdir(outbox_dir),
+        "every queued recipient is delivered exactly once":
+            handler.messages == [["r@ok.example"], ["s@busy.example"]],
+    }
+
+
+def main():
+    logging.getLogger("mail.log").setLevel(logging.WARNING)
+
+    failures = 0
+    for check in (check_batching, check_refusals, check_all_refused, check_no_reply, check_flush):
+        handler = StandInHandler()
+        port = free_port()
+        controller = Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        try:
+            with tempfile.TemporaryDirectory() as outbox_dir:
+                results = check(handler, port, outbox_dir)
+        except Exception as e:
+            results = {f"{check.__name__} raised {e.__class__.__name__}: {e}": False}
+        finally:
+            controller.stop()
+
+        for name, passed in results.items():
+            print(f"{'ok  ' if passed else 'FAIL'} {name}")
+            failures += not passed
+
+    print(f"{failures} failure(s)" if failures else "All email delivery checks passed")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
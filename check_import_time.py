@@ -0,0 +1,108 @@
+"""
+Import-time budget check for the pipeline modules.
+
+Imports each module in a fresh interpreter with `python -X importtime`, and fails if
+    - a module's cumulative import time is over budget, or
+    - importing it pulls in one of the heavy dependencies that should only load
+      inside the stage that needs them.
+
+Usage:
+    python check_import_time.py [--budget-ms 250] [--runs 3]
+"""
+
+import argparse
+import subprocess
+import sys
+
+MODULES = [
+    "main_script",
+    "backfill",
+    "data_extraction",
+    "data_formatting",
+    "clustering",
+    "interaction",
+    "email_delivery",
+    "memory_budget",
+    "web_service",
+    "text_normalisation",
+    "config",
+]
+
+# Only imported lazily, by the stage that uses them
+DEFERRED_MODULES = [
+    "sklearn",
+    "google.generativeai",
+    "langid",
+    "tkinter",
+    "transformers",
+    "sentence_transformers",
+]
+
+
+def measure_import(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        tuple: (cumulative import time of the module in ms, set of every module imported)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative_ms = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        name = name.strip()
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        imported.add(name)
+        if name == module:
+            cumulative_ms = int(cumulative) / 1000
+
+    return cumulative_ms, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if pipeline modules import too slowly.")
+    parser.add_argument("--budget-ms", type=float, default=250.0,
+                        help="Maximum cumulative import time per module")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Imports per module; the fastest run is used to smooth out noise")
+    args = parser.parse_args()
+
+    failures = []
+    for module in MODULES:
+        timings = []
+        imported = set()
+        for _ in range(args.runs):
+            cumulative_ms, imported = measure_import(module)
+            timings.append(cumulative_ms)
+        best_ms = min(timings)
+
+        heavy = sorted(m for m in DEFERRED_MODULES if m in imported)
+        status = "ok"
+        if best_ms > args.budget_ms:
+            status = "OVER BUDGET"
+            failures.append(f"{module} took {best_ms:.0f}ms (budget {args.budget_ms:.0f}ms)")
+        if heavy:
+            status = "EAGER IMPORT"
+            failures.append(f"{module} imports {', '.join(heavy)} at startup")
+
+        print(f"{module:<20} {best_ms:8.1f}ms  {status}")
+
+    if failures:
+        print("\nImport-time check failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
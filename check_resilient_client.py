@@ -0,0 +1,263 @@
+"""
+Exercise ResilientClient and run_plan against a local fault-injecting HTTP server.
+
+The stub server answers with 503s, 429s with Retry-After, hangs, slow replies and
+dropped connections, and the checks assert that retries, hedged requests, the
+circuit breaker, the fetch deadline, partial results from run_plan and the quota
+charged for each of them behave as documented.
+
+Usage:
+    python check_resilient_client.py
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+from request_planner import DailyQuota, run_plan
+from resilient_client import CircuitOpenError, Deadline, DeadlineExceeded, ResilientClient
+
+HANG_SECONDS = 3
+
+
+class FaultInjectingHandler(BaseHTTPRequestHandler):
+    """
+    Paths:
+        /ok              200 with one article
+        /flaky/<n>       503 (Retry-After: 0) for the first n requests, then 200
+        /rate-limited    429 (Retry-After: 1) on the first request, then 200
+        /down            503 until the server's `healthy` flag is set, then 200
+        /hang            answers only after HANG_SECONDS
+        /slow-once       first request answers after HANG_SECONDS, later ones at once
+        /drop            closes the connection without answering
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, headers=None):
+        body = json.dumps({"articles": [{"title": self.path}]}).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        count = self.server.record(path)
+
+        if path == "/ok":
+            self._reply(200)
+        elif path.startswith("/flaky/"):
+            failures = int(path.rsplit("/", 1)[1])
+            self._reply(503 if count <= failures else 200, {"Retry-After": "0"})
+        elif path == "/rate-limited":
+            self._reply(429 if count == 1 else 200, {"Retry-After": "1"})
+        elif path == "/down":
+            self._reply(200 if self.server.healthy else 503)
+        elif path == "/hang" or (path == "/slow-once" and count == 1):
+            time.sleep(HANG_SECONDS)
+            self._reply(200)
+        elif path == "/slow-once":
+            self._reply(200)
+        elif path == "/drop":
+            self.close_connection = True
+        else:
+            self._reply(404)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FaultInjectingHandler)
+        self.healthy = False
+        self.hits = {}
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out close the socket before /hang answers; that's expected
+        pass
+
+    def record(self, path):
+        with self._lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+            return self.hits[path]
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+def make_client(**overrides):
+    options = dict(connect_timeout=1, read_timeout=0.5, max_retries=3, backoff_base=0.01,
+                   backoff_max=2, failure_threshold=100, reset_timeout=60)
+    options.update(overrides)
+    return ResilientClient(**options)
+
+
+def make_quota():
+    return DailyQuota("newsapi", daily_limit=100, run_limit=100, state_path=None)
+
+
+def raises(exception, call):
+    try:
+        call()
+    except exception:
+        return True
+    return False
+
+
+def check_retries(server):
+    client = make_client()
+    results = {
+        "503 twice then 200 succeeds on the third call":
+            client.get_json(server.url("/flaky/2"))["articles"] and server.hits["/flaky/2"] == 3,
+        "503 on every retry gives up after max_retries + 1 calls":
+            raises(requests.HTTPError, lambda: client.get_json(server.url("/flaky/9")))
+            and server.hits["/flaky/9"] == 4,
+        "dropped connections are retried, then raised":
+            raises(requests.ConnectionError, lambda: client.get_json(server.url("/drop")))
+            and server.hits["/drop"] == 4,
+        "read timeouts are retried, then raised":
+            raises(requests.Timeout, lambda: make_client(max_retries=1).get_json(server.url("/hang")))
+            and server.hits["/hang"] == 2,
+    }
+
+    started = time.monotonic()
+    client.get_json(server.url("/rate-limited"))
+    results["429 waits for Retry-After before retrying"] = (
+        server.hits["/rate-limited"] == 2 and time.monotonic() - started >= 1
+    )
+    client.close()
+    return results
+
+
+def check_quota_charges(server):
+    client = make_client()
+    flaky, failing, skipped = make_quota(), make_quota(), make_quota()
+
+    client.get_json(server.url("/flaky/1"), on_request=flaky.consume)
+    raises(requests.HTTPError, lambda: client.get_json(server.url("/flaky/8"), on_request=failing.consume))
+
+    client.close()
+
+    # The first call opens the circuit; the second is rejected before anything is sent
+    client = make_client(max_retries=0, failure_threshold=1)
+    url = server.url("/flaky/5")
+    raises(requests.HTTPError, lambda: client.get_json(url))
+    raises(CircuitOpenError, lambda: client.get_json(url, on_request=skipped.consume))
+    client.close()
+
+    return {
+        "every retry is charged to the quota": flaky.used_this_run == server.hits["/flaky/1"] == 2,
+        "a request that exhausts its retries is charged max_retries + 1 times":
+            failing.used_this_run == server.hits["/flaky/8"] == 4,
+        "a call rejected by an open circuit is not charged":
+            skipped.used_this_run == 0 and server.hits["/flaky/5"] == 1,
+    }
+
+
+def check_hedging(server):
+    client = make_client(read_timeout=10, hedge_after=0.2)
+    quota = make_quota()
+    started = time.monotonic()
+    answered = bool(client.get_json(server.url("/slow-once"), on_request=quota.consume))
+    elapsed = time.monotonic() - started
+
+    fast = make_quota()
+    client.get_json(server.url("/ok"), on_request=fast.consume)
+    client.close()
+
+    return {
+        "a slow request is hedged and the faster answer is used":
+            answered and elapsed < HANG_SECONDS and server.hits["/slow-once"] == 2,
+        "a hedged request is charged twice": quota.used_this_run == 2,
+        "a request answering before hedge_after is sent and charged once": fast.used_this_run == 1,
+    }
+
+
+def check_circuit_breaker(server):
+    client = make_client(max_retries=0, failure_threshold=3, reset_timeout=0.5)
+    url = server.url("/down")
+    breaker = client.breaker_for(url)
+
+    for _ in range(3):
+        raises(requests.HTTPError, lambda: client.get_json(url))
+    opened = breaker.state == "open"
+    rejected = raises(CircuitOpenError, lambda: client.get_json(url)) and server.hits["/down"] == 3
+
+    time.sleep(0.6)
+    half_open = breaker.state == "half-open"
+    raises(requests.HTTPError, lambda: client.get_json(url))
+    reopened = breaker.state == "open" and server.hits["/down"] == 4
+
+    time.sleep(0.6)
+    server.healthy = True
+    recovered = bool(client.get_json(url)) and breaker.state == "closed"
+    client.close()
+
+    return {
+        "circuit opens after failure_threshold failures": opened,
+        "open circuit rejects calls without reaching the server": rejected,
+        "circuit goes half-open after reset_timeout": half_open,
+        "failed trial call reopens the circuit": reopened,
+        "successful trial call closes the circuit": recovered,
+    }
+
+
+def check_deadline(server):
+    client = make_client(read_timeout=10, deadline=Deadline(1))
+    started = time.monotonic()
+    stopped = raises(DeadlineExceeded, lambda: client.get_json(server.url("/hang")))
+    elapsed = time.monotonic() - started
+    client.close()
+    return {"deadline cuts off a hanging fetch": stopped and elapsed < 2}
+
+
+def check_partial_results(server):
+    client = make_client(read_timeout=10, deadline=Deadline(1))
+
+    quota = make_quota()
+
+    def fetch_page(batch, cursor, page_number):
+        url = server.url("/ok" if batch == "first" else "/hang")
+        return client.get_json(url, on_request=quota.consume)["articles"], None
+
+    articles = run_plan(["first", "second", "third"], fetch_page, quota, deadline=client.deadline)
+    client.close()
+    # The third page is never started, so only the two requests that went out are charged
+    return {"run_plan keeps earlier pages when the deadline passes":
+            articles == [{"title": "/ok"}] and quota.used_this_run == 2}
+
+
+def main():
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    failures = 0
+    try:
+        for check in (check_retries, check_quota_charges, check_hedging, check_circuit_breaker,
+                      check_deadline, check_partial_results):
+            try:
+                results = check(server)
+            except Exception as e:
+                results = {f"{check.__name__} raised {e.__class__.__name__}: {e}": False}
+            for name, passed in results.items():
+                print(f"{'ok  ' if passed else 'FAIL'} {name}")
+                failures += not passed
+    finally:
+        server.shutdown()
+
+    print(f"{failures} failure(s)" if failures else "All resilient client checks passed")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
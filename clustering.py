@@ -1,14 +1,29 @@
-import os
-from dotenv import load_dotenv
+import time
+from collections import defaultdict, Counter
+from itertools import islice
+from config import get_env
+from memory_budget import MEMORY_BUDGET_MB, MB, MemoryBudget
+from text_normalisation import normalise_text, normalised_article, normalise_batch, clear_cache
+from taxonomy import CategoryTaxonomy, is_excluded
+from llm_parsing import extract_json, validate_category_response, build_repair_prompt
 
-#load_dotenv(dotenv_path="environmentvariables.env") for local 
-load_dotenv()
+# scikit-learn and google.generativeai are imported inside the functions that use
+# them; both take seconds to import and most entry points never need them.
 
-GOOGLE_API = os.getenv("GOOGLE_API")
+GOOGLE_API = get_env("GOOGLE_API")
+
+# Vocabulary limits shared by the in-memory and out-of-core vectorisers
+MAX_FEATURES = 1000
+MAX_DF = 0.8
+
+# Out-of-core clustering (used when a memory budget is set)
+HASHING_FEATURES = 2 ** 20
+AUTO_K_SAMPLE_SIZE = 10_000
+PARTIAL_FIT_EPOCHS = 3
 
 class EnhancedArticleClusterer:
     def __init__(self, n_clusters='auto', method='kmeans', use_categories=False, 
-                 category_weight=2):
+                 category_weight=2, memory_budget_mb=None, chunk_size=5000):
         """
         Initialize the enhanced article clusterer.
         
@@ -17,23 +32,23 @@ class EnhancedArticleClusterer:
             method: 'kmeans', 'dbscan', or 'hierarchical'
             use_categories: Whether to use LLM categories in clustering
             category_weight: How many times to repeat categories for emphasis (default: 2)
+            memory_budget_mb: Cluster out of core within this many MB (defaults to the
+                MEMORY_BUDGET_MB env variable; 0 keeps everything in memory)
+            chunk_size: Articles vectorised at a time in out-of-core mode
         """
         self.n_clusters = n_clusters
         self.method = method
         self.use_categories = use_categories
         self.category_weight = category_weight
+        self.memory_budget_mb = MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+        self.chunk_size = chunk_size
         self.vectorizer = None
         self.clusters = {}
         self.category_stats = {}
         
     def preprocess_text(self, text):
         """Clean and preprocess text for better clustering."""
-        if not text:
-            return ""
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = ' '.join(text.split())
-        return text
+        return normalise_text(text)
     
     def combine_all_text(self, article):
         """Combine title, description, and categories into one text string."""
@@ -55,14 +70,13 @@ class EnhancedArticleClusterer:
     
     def combine_title_description(self, article):
         """Combine title and description with title weighted more heavily (for text-only mode)."""
-        title = article.get('title', '')
-        description = article.get('description', '')
-        combined = f"{title} {title} {description}"
-        return self.preprocess_text(combined)
+        return normalised_article(article).weighted_text
     
     def determine_optimal_clusters(self, vectors, max_clusters=10):
         """Use elbow method to determine optimal number of clusters."""
-        n_samples = len(vectors)
+        from sklearn.cluster import KMeans
+
+        n_samples = vectors.shape[0]
         max_k = min(max_clusters, n_samples // 2)
         
         if max_k < 2:
@@ -97,19 +111,26 @@ class EnhancedArticleClusterer:
         """
         if not articles:
             return {}
+        if self.memory_budget_mb:
+            return self.cluster_articles_out_of_core(articles)
+
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.cluster import KMeans, DBSCAN
         
         # Combine all text (title, description, and categories)
         if self.use_categories:
             combined_texts = [self.combine_all_text(article) for article in articles]
         else:
-            combined_texts = [self.combine_title_description(article) for article in articles]
+            combined_texts = [normalised.weighted_text for normalised in normalise_batch(articles)]
         
+        # Texts are already lower-cased by the shared normaliser
         self.vectorizer = TfidfVectorizer(
-            max_features=1000,
+            lowercase=False,
+            max_features=MAX_FEATURES,
             stop_words='english',
             ngram_range=(1, 2),
             min_df=1,
-            max_df=0.8
+            max_df=MAX_DF
         )
         
         try:
@@ -120,7 +141,7 @@ class EnhancedArticleClusterer:
         
         # Determine number of clusters
         if self.n_clusters == 'auto':
-            n_clusters = self.determine_optimal_clusters(tfidf_matrix.toarray())
+            n_clusters = self.determine_optimal_clusters(tfidf_matrix)
         else:
             n_clusters = min(self.n_clusters, len(articles))
         
@@ -130,7 +151,7 @@ class EnhancedArticleClusterer:
             cluster_labels = clusterer.fit_predict(tfidf_matrix)
         elif self.method == 'dbscan':
             clusterer = DBSCAN(eps=0.5, min_samples=2, metric='cosine')
-            cluster_labels = clusterer.fit_predict(tfidf_matrix.toarray())
+            cluster_labels = clusterer.fit_predict(tfidf_matrix)
         else:
             raise ValueError("Method must be 'kmeans' or 'dbscan'")
         
@@ -152,6 +173,144 @@ class EnhancedArticleClusterer:
         
         return self.clusters
     
+    def cluster_articles_out_of_core(self, articles):
+        """
+        Memory-bounded version of cluster_articles for very large article sets.
+
+        Articles are read `chunk_size` at a time and hashed into term counts, so no
+        vocabulary or dense matrix is built for the whole set. Document frequencies
+        are summed across chunks to give the IDF, the same max_df and max_features
+        limits as the in-memory vectoriser are applied, and MiniBatchKMeans is
+        trained chunk by chunk. Chunk matrices and the label array go to
+        memory-mapped spill files once the memory budget is exceeded.
+
+        Args:
+            articles: Iterable of dictionaries with 'title' and 'description' (read once)
+
+        Returns:
+            Dictionary with cluster labels as keys and lists of titles as values
+        """
+        import numpy as np
+        from scipy import sparse
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.preprocessing import normalize
+
+        if self.method != 'kmeans':
+            raise ValueError("Only 'kmeans' is supported when clustering with a memory budget")
+
+        hasher = HashingVectorizer(
+            n_features=HASHING_FEATURES,
+            lowercase=False,
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32
+        )
+
+        with MemoryBudget(self.memory_budget_mb) as budget:
+            # Pass 1: hash each chunk and count document and term frequencies
+            titles, article_categories, chunks = [], [], []
+            document_frequency = np.zeros(HASHING_FEATURES, dtype=np.int64)
+            term_frequency = np.zeros(HASHING_FEATURES, dtype=np.float64)
+
+            iterator = iter(articles)
+            while True:
+                chunk = list(islice(iterator, self.chunk_size))
+                if not chunk:
+                    break
+                titles.extend(article['title'] for article in chunk)
+                article_categories.extend(article.get('categories') for article in chunk)
+
+                if self.use_categories:
+                    texts = [self.combine_all_text(article) for article in chunk]
+                else:
+                    texts = [normalised.weighted_text for normalised in normalise_batch(chunk)]
+                counts = hasher.transform(texts)
+                document_frequency += np.bincount(counts.indices, minlength=HASHING_FEATURES)
+                term_frequency += np.asarray(counts.sum(axis=0)).ravel()
+
+                chunks.append(sparse.csr_matrix(
+                    (budget.keep(counts.data, "data"), budget.keep(counts.indices, "indices"),
+                     budget.keep(counts.indptr, "indptr")),
+                    shape=counts.shape, copy=False
+                ))
+                if budget.exceeded():
+                    clear_cache()  # the normalisation cache is the largest thing left in RAM
+
+            n_documents = len(titles)
+            if not n_documents:
+                return {}
+
+            eligible = np.flatnonzero((document_frequency > 0)
+                                      & (document_frequency <= MAX_DF * n_documents))
+            if not len(eligible):
+                # Same fallback as when the in-memory vectoriser has no terms left
+                return {"Cluster 1": titles}
+
+            features = eligible[np.argsort(-term_frequency[eligible], kind='stable')[:MAX_FEATURES]]
+            idf = np.log((1 + n_documents) / (1 + document_frequency[features])) + 1
+            idf_diagonal = sparse.diags(idf.astype(np.float32))
+            del document_frequency, term_frequency
+
+            def tfidf(counts):
+                return normalize(counts[:, features] @ idf_diagonal)
+
+            # Determine number of clusters on a sample
+            if self.n_clusters == 'auto':
+                sample, sampled = [], 0
+                for counts in chunks:
+                    if sampled >= AUTO_K_SAMPLE_SIZE:
+                        break
+                    sample.append(tfidf(counts[:AUTO_K_SAMPLE_SIZE - sampled]))
+                    sampled += sample[-1].shape[0]
+                n_clusters = self.determine_optimal_clusters(sparse.vstack(sample).tocsr())
+                del sample
+            else:
+                n_clusters = self.n_clusters
+            n_clusters = min(n_clusters, n_documents)
+
+            # Pass 2: train on one chunk at a time
+            clusterer = MiniBatchKMeans(n_clusters=n_clusters, random_state=42,
+                                        batch_size=min(self.chunk_size, 1024), n_init=3)
+            for _ in range(PARTIAL_FIT_EPOCHS):
+                pending, pending_rows = [], 0
+                for counts in chunks:
+                    pending.append(tfidf(counts))
+                    pending_rows += counts.shape[0]
+                    # Every partial_fit batch needs at least n_clusters rows
+                    if pending_rows >= n_clusters:
+                        clusterer.partial_fit(sparse.vstack(pending).tocsr())
+                        pending, pending_rows = [], 0
+                # A short final remainder is still labelled below, just not trained on
+
+            # Pass 3: assign every article to its nearest centre
+            cluster_labels = budget.empty((n_documents,), np.int32, "labels")
+            offset = 0
+            for counts in chunks:
+                cluster_labels[offset:offset + counts.shape[0]] = clusterer.predict(tfidf(counts))
+                offset += counts.shape[0]
+
+            clusters = defaultdict(list)
+            for title, label in zip(titles, cluster_labels):
+                clusters[f"Cluster {label + 1}"].append(title)
+            self.clusters = dict(sorted(clusters.items(),
+                                      key=lambda x: len(x[1]),
+                                      reverse=True))
+
+            self.category_stats = {}
+            if any(article_categories):
+                self._generate_cluster_stats(
+                    [{'categories': categories or []} for categories in article_categories],
+                    cluster_labels
+                )
+
+            print(f"Clustered {n_documents} articles in {len(chunks)} chunk(s), "
+                  f"{budget.spilled_bytes / MB:.0f} MB spilled to disk")
+
+        return self.clusters
+
     def _generate_cluster_stats(self, articles, cluster_labels):
         """Generate statistics about categories in each cluster."""
         self.category_stats = {}
@@ -260,6 +419,8 @@ def determine_category_for_cluster(headline, description, google_api):
               and a summary.
     """
 
+    import google.generativeai as genai
+
     genai.configure(api_key=google_api)
 
     # Initialize the Gemini Pro model
@@ -291,16 +452,29 @@ def determine_category_for_cluster(headline, description, google_api):
 
     try:
         response = model.generate_content(prompt)
-        raw_text = response.text.strip()
-        
-        # Clean up any markdown or extra text the model might generate
-        if raw_text.startswith("```json"):
-            raw_text = raw_text.strip("```json").strip("```")
+        result, broken = validate_category_response(extract_json(response.text))
+
+        # Re-prompt once if the category is unusable. The summary isn't used in the
+        # digest, so a broken summary alone isn't worth a second paid call.
+        if "category_name" in broken:
+            print(f"Repairing category_name for {headline}")
+            try:
+                repair = model.generate_content(
+                    build_repair_prompt(headline, description, ["category_name"], result))
+                repaired, _ = validate_category_response(extract_json(repair.text), ["category_name"])
+                result.update(repaired)
+            except Exception as e:
+                # Keep whatever the first reply gave us
+                print(f"Repair request failed for {headline}: {e}")
+            broken = [field for field in broken if field not in result]
+
+        if "category_name" in broken:
+            return {
+                "error": "No valid category_name in response"
+            }
 
-        result = json.loads(raw_text)
-        
         return {
-            "determined_category": result.get("category_name", "Unknown"),
+            "determined_category": result["category_name"],
             "summary": result.get("summary", "No summary provided.")
         }
         
@@ -310,22 +484,85 @@ def determine_category_for_cluster(headline, description, google_api):
             "error": str(e)
         }
     
-def make_categorisations(full_articles_database):
-    final_enhanced_outputs = []
+def request_categories(full_articles_database, delay=3):
+    """
+    Ask Gemini for a raw category and summary for every article.
+
+    Args:
+        full_articles_database (list of dict): Articles with 'title' and 'description'.
+        delay (float): Seconds to sleep between LLM calls (0 disables rate limiting).
+
+    Returns:
+        tuple: (list of [raw_category, title, description, summary] for every article
+            that came back with a usable category, list of the articles that failed)
+    """
+    responses = []
+    failures = []
     for i in full_articles_database:
         result = determine_category_for_cluster(i['title'],i['description'], GOOGLE_API)
-        
+
         if "error" in result:
             print(f"Failed to process {i['title']}: {result['error']}")
+            failures.append(i)
         else:
-            print(f"\n--- Analysis for {i['title']} ---")
-            print(f"Determined Category: {result['determined_category']}")
-            print(f"Summary: {result['summary']}")
-            final_enhanced_outputs.append([result['determined_category'],i['title'],i['description']])
+            responses.append([result['determined_category'], i['title'], i['description'],
+                              result['summary']])
 
-        time.sleep(3)
-    
-    final_filtered_data = [item for item in final_enhanced_outputs if 'sport' or 'lottery' or 'music'  not in item[0].lower()]
+        if delay:
+            time.sleep(delay)
+
+    return responses, failures
+
+
+def canonicalise_categories(responses, taxonomy):
+    """
+    Merge raw category labels into canonical buckets and drop excluded categories.
+
+    Args:
+        responses (list): [raw_category, title, description, summary] entries
+            from request_categories.
+        taxonomy (CategoryTaxonomy): Taxonomy to canonicalise labels with.
+
+    Returns:
+        list: [category, title, description] for every article that is kept.
+    """
+    final_enhanced_outputs = []
+    for raw_category, title, description, summary in responses:
+        category = taxonomy.canonicalise(raw_category)
+        print(f"\n--- Analysis for {title} ---")
+        print(f"Determined Category: {raw_category} -> {category}")
+        print(f"Summary: {summary}")
+        if is_excluded(raw_category) or is_excluded(category):
+            print(f"Excluded category: {category}")
+        else:
+            final_enhanced_outputs.append([category, title, description])
+    return final_enhanced_outputs
+
+
+def make_categorisations(full_articles_database, delay=3, taxonomy=None):
+    """
+    Ask Gemini for a category and summary for every article.
+
+    Free-text category names are merged into canonical buckets, and articles in
+    excluded categories (sport, lottery, music) are dropped.
+
+    Args:
+        full_articles_database (list of dict): Articles with 'title' and 'description'.
+        delay (float): Seconds to sleep between LLM calls (0 disables rate limiting).
+        taxonomy (CategoryTaxonomy): Taxonomy to canonicalise labels with. If omitted,
+            the persisted taxonomy is loaded and saved back with any new labels.
+
+    Returns:
+        list: [category, title, description] for every successfully categorised article.
+    """
+    owns_taxonomy = taxonomy is None
+    if owns_taxonomy:
+        taxonomy = CategoryTaxonomy()
+
+    responses, _ = request_categories(full_articles_database, delay)
+    final_enhanced_outputs = canonicalise_categories(responses, taxonomy)
 
-    return final_filtered_data
+    if owns_taxonomy:
+        taxonomy.save()
 
+    return final_enhanced_outputs
@@ -0,0 +1,28 @@
+"""
+Single place where the environment is loaded.
+
+load_dotenv() runs once, the first time any module reads a setting, instead of
+being called at import time by every module.
+"""
+
+import os
+
+_env_loaded = False
+
+
+def load_env():
+    """Load variables from a .env file into the environment (only once per process)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+
+    from dotenv import load_dotenv
+    #load_dotenv(dotenv_path="environmentvariables.env") # for local
+    load_dotenv()
+    _env_loaded = True
+
+
+def get_env(name, default=None):
+    """Read a setting, loading the .env file first if it hasn't been yet."""
+    load_env()
+    return os.getenv(name, default)
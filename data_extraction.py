@@ -1,76 +1,178 @@
 import requests
-import time
 import os
-from dotenv import load_dotenv
+import json
+from datetime import date
+from config import get_env
+from resilient_client import ResilientClient, CircuitOpenError
+from request_planner import (
+    DailyQuota, chunked, run_plan,
+    NEWSAPI_MAX_SOURCES_PER_REQUEST, NEWSAPI_PAGE_SIZE, NEWSIO_MAX_COUNTRIES_PER_REQUEST,
+)
+
+NEWSAPI_KEY = get_env("NEWSAPI_KEY")
+NEWSIOAPI_KEY = get_env("NEWSIOAPI_KEY")
+GNEWSAPI_KEY = get_env("GNEWSAPI_KEY")
+ARCHIVE_DIR = get_env("ARCHIVE_DIR")  # when set, raw provider payloads are kept for backfills
+
+
+def archive_payload(provider, key, payload, archive_dir=None, day=None):
+    """
+    Save a raw provider JSON payload so the day can be reprocessed later by backfill.py.
 
-#load_dotenv(dotenv_path="environmentvariables.env") for local 
-load_dotenv()
+    Payloads are written to <archive_dir>/<YYYY-MM-DD>/<provider>/<key>.json.
 
-NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
-NEWSIOAPI_KEY = os.getenv("NEWSIOAPI_KEY")
-GNEWSAPI_KEY = os.getenv("GNEWSAPI_KEY")
+    Args:
+        provider (str): 'newsapi', 'newsio' or 'gnews'.
+        key (str): Identifier of the request within the day (source or country code).
+        payload (dict): Decoded JSON response body.
+        archive_dir (str): Root archive directory (defaults to ARCHIVE_DIR env variable).
+        day (date): Day the payload belongs to (defaults to today).
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not archive_dir:
+        return
+
+    day = day or date.today()
+    folder = os.path.join(archive_dir, day.isoformat(), provider)
+    os.makedirs(folder, exist_ok=True)
+    safe_key = "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+
+    with open(os.path.join(folder, f"{safe_key}.json"), "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+
+
+def parse_news_api_payload(data):
+    """Turn a NewsAPI top-headlines payload into a list of article dicts."""
+    return [
+        {
+            "title": article.get("title", ""),
+            "description": article.get("description", ""),
+            "provider": "newsapi",
+            "source": (article.get("source") or {}).get("name"),
+        }
+        for article in data.get("articles", [])
+    ]
+
+
+def parse_newsio_payload(data):
+    """Turn a NewsData.io payload into a list of article dicts, skipping sport."""
+    return [
+        {
+            "title": article.get("title", "No title"),
+            "description": article.get("description", "No description"),
+            "provider": "newsio",
+            "source": article.get("source_name") or article.get("source_id"),
+        }
+        for article in data.get("results", [])
+        if article.get("category") != "sports"
+    ]
+
+
+def parse_gnews_payload(data):
+    """Turn a GNews top-headlines payload into a list of article dicts."""
+    return [
+        {
+            "title": article.get("title"),
+            "description": article.get("description"),
+            "provider": "gnews",
+            "source": (article.get("source") or {}).get("name"),
+        }
+        for article in data.get("articles") or []
+    ]
+
+
+PAYLOAD_PARSERS = {
+    "newsapi": parse_news_api_payload,
+    "newsio": parse_newsio_payload,
+    "gnews": parse_gnews_payload,
+}
+
+def _get_json(client, url, params, label, quota):
+    """
+    GET a provider endpoint through the resilient client.
 
-def get_top_headlines_from_news_api(verbose=False):
+    Every HTTP request the client sends, retries included, is charged to `quota`.
+    Returns the decoded payload, or None if the request failed after retries or
+    the endpoint's circuit is open. DeadlineExceeded is left to propagate so the
+    request plan stops with the results gathered so far.
+    """
+    try:
+        return client.get_json(url, params, on_request=quota.consume)
+    except CircuitOpenError as e:
+        print(f"Skipping {label}: {e}")
+    except requests.HTTPError as e:
+        # Don't print the exception itself: its URL contains the API key
+        print(f"Request failed for {label}: HTTP {e.response.status_code}")
+    except (requests.RequestException, ValueError) as e:
+        print(f"Request failed for {label}: {e.__class__.__name__}")
+    return None
+
+
+def get_top_headlines_from_news_api(verbose=False, quota=None, client=None):
     """
     Fetch top headlines from multiple news outlets using the NewsAPI.
+
+    Sources are sent as comma-separated batches rather than one request per
+    outlet, and further pages are followed while the daily quota allows.
     
     Args:
-        api_key (str): Your NewsAPI key (optional, defaults to ENV variable).
         verbose (bool): If True, prints debug information.
+        quota (DailyQuota): Call budget to charge (defaults to the persisted NewsAPI quota).
+        client (ResilientClient): HTTP client to use (its deadline bounds the whole fetch).
     
     Returns:
-        list: List of [title, description, content] for all retrieved articles.
+        list: List of {'title', 'description', 'provider', 'source'} dicts for all retrieved articles.
     """
 
     list_of_sources  = ['cnn', 'new-york-magazine', 'reuters', 'the-washington-post', 'the-washington-times', 'associated-press', 'abc-news-au', 'australian-financial-review', 'google-news-au', 'news-com-au', 'aftenposten', 'nrk', 'ansa', 'il-sole-24-ore', 'football-italia', 'google-news-it', 'la-repubblica', 'argaam', 'google-news-sa', 'sabq', 'the-express-tribune', 'dawn', 'jang', 'the-news-international', 'brecorder', 'bbc-news', 'independent', 'wired-de', 'wirtschafts-woche', 'blasting-news-br', 'globo', 'google-news-br', 'info-money', 'cbc-news', 'financial-post', 'google-news-ca', 'the-globe-and-mail', 'el-mundo', 'google-news-ar', 'infobae', 'la-gaceta', 'la-nacion', 'google-news-fr', 'le-monde', 'les-echos', 'liberation', 'google-news-in', 'the-hindu', 'the-times-of-india', 'the-jerusalem-post', 'ynet', 'lenta', 'rbc', 'rt', 'tass', 'vedomosti', 'kommersant', 'the-moscow-times', 'goteborgs-posten', 'svenska-dagbladet', 'news24', 'eNCA', 'SABC News', 'Daily Maverick', 'The Mail & Guardian', 'Eyewitness News', 'RTE', 'RTL Nieuws', 'techcrunch-cn', 'xinhua-net']
 
     url = "https://newsapi.org/v2/top-headlines"
-    concatenated = []
-
-    with requests.Session() as session:
-        for outlet in list_of_sources:
-            params = {
-                "sources": outlet,
-                "apiKey": NEWSAPI_KEY
-            }
+    quota = quota or DailyQuota("newsapi")
+    client = client or ResilientClient()
 
-            response = session.get(url, params=params)
+    def fetch_page(sources, page, page_number):
+        params = {
+            "sources": ",".join(sources),
+            "pageSize": NEWSAPI_PAGE_SIZE,
+            "page": page_number,
+            "apiKey": NEWSAPI_KEY
+        }
 
-            if response.status_code == 200:
-                data = response.json()
-                articles = data.get("articles", [])
+        data = _get_json(client, url, params, f"{sources[0]} +{len(sources) - 1} sources", quota)
+        if data is None:
+            return [], None
 
-                results = [
-                    {
-                        article.get("title", ""),
-                        article.get("description", ""),
-                    }
-                    for article in articles
-                ]
-                concatenated.extend(results)
+        archive_payload("newsapi", f"{sources[0]}_{len(sources)}_page{page_number}", data)
+        results = parse_news_api_payload(data)
 
-                if verbose:
-                    print(f"{outlet}: {len(results)} articles retrieved.")
+        if verbose:
+            print(f"{sources[0]} +{len(sources) - 1} sources, page {page_number}: "
+                  f"{len(results)} articles retrieved.")
 
-            else:
-                if verbose:
-                    print("Error:", response.status_code, response.text)
-            
-            time.sleep(3)
+        has_more = page_number * NEWSAPI_PAGE_SIZE < data.get("totalResults", 0)
+        return results, (page_number + 1 if has_more else None)
 
-    return concatenated
+    return run_plan(
+        chunked(list_of_sources, NEWSAPI_MAX_SOURCES_PER_REQUEST),
+        fetch_page, quota, delay=3, verbose=verbose, deadline=client.deadline
+    )
 
 
-def get_headlines_from_newsio(reqs_per_min=15):
+def get_headlines_from_newsio(reqs_per_min=15, quota=None, client=None):
 
     """
     Fetch top headlines from multiple news outlets using the newsio.
+
+    Countries are sent as comma-separated batches and the `nextPage` cursor is
+    followed while the daily quota allows.
     
     Args:
         reqs_per_min (int): Numerical value for how many proportions of requests to make
+        quota (DailyQuota): Call budget to charge (defaults to the persisted NewsData quota).
+        client (ResilientClient): HTTP client to use (its deadline bounds the whole fetch).
 
     Returns:
-        list: List of [title, description, content] for all retrieved articles.
+        list: List of {'title', 'description', 'provider', 'source'} dicts for all retrieved articles.
     """
 
     url = "https://newsdata.io/api/1/latest"
@@ -85,66 +187,51 @@ def get_headlines_from_newsio(reqs_per_min=15):
     'ae', 'sa', 'ng', 'ke', 'mx', 'ar']
 
     delay = 60.0 / reqs_per_min  # seconds between requests
-    concatenated = []
-    session = requests.Session()  # reuse TCP connection
+    quota = quota or DailyQuota("newsio")
+    client = client or ResilientClient()
 
-    for country_code in country_list:
+    def fetch_page(countries, next_page, page_number):
+        label = ",".join(countries)
         params = {
             "apikey": NEWSIOAPI_KEY,
-            "country": country_code,
+            "country": label,
             "language": "en",
             "category": "top"
         }
+        if next_page:
+            params["page"] = next_page
+
+        data = _get_json(client, url, params, label, quota)
+        if data is None:
+            return [], None
+
+        archive_payload("newsio", f"{countries[0]}_{len(countries)}_page{page_number}", data)
+        print(f"[{label}] Found {len(data.get('results', []))} top headlines (page {page_number})")
+
+        return parse_newsio_payload(data), data.get("nextPage")
 
-        try:
-            response = session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.exceptions.HTTPError as e:
-            # If the API returns 429 it means "too many requests"
-            if response.status_code == 429:
-                retry_after = response.headers.get("Retry-After")
-                wait = int(retry_after) if retry_after and retry_after.isdigit() else delay * 2
-                print(f"Rate limited. Sleeping for {wait} seconds.")
-                time.sleep(wait)
-                # optionally retry once after sleeping
-                try:
-                    response = session.get(url, params=params, timeout=10)
-                    response.raise_for_status()
-                    data = response.json()
-                except Exception as e2:
-                    print(f"Retry failed for {country_code}: {e2}")
-                    continue
-            else:
-                print(f"Request failed for {country_code}: {e}")
-                continue
-        except Exception as e:
-            print(f"Request failed for {country_code}: {e}")
-            continue
-
-        articles = data.get("results", [])
-        print(f"[{country_code}] Found {len(articles)} top headlines")
-
-        for article in articles:
-            if article.get("category") == "sports":
-                continue
-            concatenated.append({
-                "title": article.get("title", "No title"),
-                "description": article.get("description", "No description")
-            })
-
-        time.sleep(delay)
-
-    return concatenated
-
-
-def fetch_gnews_articles():
+    return run_plan(
+        chunked(country_list, NEWSIO_MAX_COUNTRIES_PER_REQUEST),
+        fetch_page, quota, delay=delay, deadline=client.deadline
+    )
+
+
+def fetch_gnews_articles(quota=None, max_pages=1, client=None):
 
     """
     Fetch top headlines from multiple countries using the gnews.
 
+    GNews only accepts one country per request, so countries cannot be
+    coalesced; spare quota is spent on further pages when max_pages > 1
+    (paging needs a paid GNews plan).
+
+    Args:
+        quota (DailyQuota): Call budget to charge (defaults to the persisted GNews quota).
+        max_pages (int): Maximum number of pages to fetch per country.
+        client (ResilientClient): HTTP client to use (its deadline bounds the whole fetch).
+
     Returns:
-        list: List of [title, description, content] for all retrieved articles.
+        list: List of {'title', 'description', 'provider', 'source'} dicts for all retrieved articles.
     """
 
     country_codes = [
@@ -179,30 +266,29 @@ def fetch_gnews_articles():
     ]
 
     url = "https://gnews.io/api/v4/top-headlines"
+    quota = quota or DailyQuota("gnews")
+    client = client or ResilientClient()
 
-    concat = []
-    for country in country_codes:
+    def fetch_page(countries, page, page_number):
+        country = countries[0]
         params = {
             "apikey": GNEWSAPI_KEY,
             "categories": "-sports",
             "country": country,
             "lang": "en"
         }
+        if page_number > 1:
+            params["page"] = page_number
+
+        data = _get_json(client, url, params, country, quota)
+        if data is None:
+            return [], None
+
+        archive_payload("gnews", f"{country}_page{page_number}", data)
+        print(f"{country} articles are extracted")
+
+        return parse_gnews_payload(data), (page_number + 1 if page_number < max_pages else None)
 
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            for article in data.get("articles"):
-                concat.append({
-                    "title": article.get("title"),
-                    "description": article.get("description")
-                })
-            print(f"{country} articles are extracted")
-        except Exception as e:
-            print(f" Failed for {country}: {e}")
-
-        time.sleep(4)
-
-    return concat
+    return run_plan(
+        chunked(country_codes, 1), fetch_page, quota, delay=4, deadline=client.deadline
+    )
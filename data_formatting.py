@@ -1,4 +1,4 @@
-import langid
+from text_normalisation import normalise_batch
 
 def filter_english_articles_and_duplicate(articles):
     """
@@ -9,16 +9,27 @@ def filter_english_articles_and_duplicate(articles):
 
     Returns:
         list of dict: Same structure as input, but only English-language and unique by title.
+        Titles differing only in case, punctuation or spacing count as duplicates.
+        Each kept article is a copy with a 'sources' list of every outlet that
+        carried the headline, so story scoring can still count coverage.
     """
-    seen_titles = set()
+    import langid  # loads its language model; only needed once filtering starts
+
+    kept_by_title = {}
     filtered = []
 
-    for article in articles:
+    for article, normalised in zip(articles, normalise_batch(articles)):
         title = (article.get("title") or "").strip()
         description = (article.get("description") or "").strip()
 
-        # Skip if title already seen or text is too short
-        if not title or title in seen_titles:
+        if not normalised.title:
+            continue
+        # Same wire headline from another outlet: keep one article, remember the outlet
+        kept = kept_by_title.get(normalised.title)
+        if kept is not None:
+            source = article.get("source")
+            if source and source not in kept["sources"]:
+                kept["sources"].append(source)
             continue
 
         combined_text = f"{title} {description}"
@@ -27,8 +38,9 @@ def filter_english_articles_and_duplicate(articles):
 
         lang, _ = langid.classify(combined_text)
         if lang == "en":
-            seen_titles.add(title)
-            filtered.append(article)
+            source = article.get("source")
+            kept = kept_by_title[normalised.title] = {**article, "sources": [source] if source else []}
+            filtered.append(kept)
 
     return filtered
 
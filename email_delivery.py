@@ -0,0 +1,243 @@
+"""
+Digest delivery over SMTP.
+
+The digest is rendered into a MIME message once and sent over a single
+authenticated connection to the whole recipient list, in batches of envelope
+recipients. Recipients refused with a temporary (4xx) reply, or lost to a
+failure with no reply at all, are written to a local outbox directory and
+retried on the next run (or with flush_outbox()). Permanent (5xx) refusals are
+logged and dropped, since resending won't change the answer.
+
+The SMTP server is configurable so delivery can be tried against a local
+stand-in, e.g. `python -m aiosmtpd -n -l localhost:8025` with
+SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SSL=false. `python check_email_delivery.py`
+runs the batching, outbox and retry checks against such a server.
+"""
+
+import json
+import os
+import smtplib
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from config import get_env
+
+EMAIL_USER = get_env("EMAIL_USER")
+EMAIL_APP_PASSWORD = get_env("EMAIL_APP_PASSWORD")
+SMTP_HOST = get_env("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(get_env("SMTP_PORT", "465"))
+SMTP_SSL = get_env("SMTP_SSL", "true").lower() != "false"
+OUTBOX_DIR = get_env("OUTBOX_DIR", "outbox")
+
+# Gmail accepts up to 100 recipients per message
+DEFAULT_BATCH_SIZE = 50
+MAX_OUTBOX_ATTEMPTS = 5
+
+
+def is_permanent(code):
+    """True for a 5xx SMTP reply code: resending the same message won't change the answer."""
+    return code is not None and 500 <= code < 600
+
+
+def build_digest_message(html_content, from_email, subject="Your Morning News Digest"):
+    """
+    Render the digest email once.
+
+    Recipients are only given on the SMTP envelope, so the same bytes can be
+    sent to every batch without leaking the list to the other readers.
+
+    Returns:
+        bytes: The serialised MIME message.
+    """
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = from_email
+    msg["To"] = from_email
+
+    msg.attach(MIMEText(html_content, "html"))
+    return msg.as_bytes()
+
+
+class SMTPDelivery:
+    def __init__(self, from_email=None, password=None, host=SMTP_HOST, port=SMTP_PORT,
+                 use_ssl=SMTP_SSL, batch_size=DEFAULT_BATCH_SIZE, outbox_dir=OUTBOX_DIR):
+        """
+        Initialise the delivery client.
+
+        Args:
+            from_email (str): Sender address and SMTP login (defaults to EMAIL_USER).
+            password (str): SMTP password, e.g. a Gmail App Password (defaults to
+                EMAIL_APP_PASSWORD). If empty, no login is attempted.
+            host (str): SMTP server host.
+            port (int): SMTP server port.
+            use_ssl (bool): Connect with SMTP_SSL rather than plain SMTP.
+            batch_size (int): Recipients per message sent.
+            outbox_dir (str): Directory where failed batches are kept for retry.
+        """
+        self.from_email = from_email or EMAIL_USER
+        self.password = EMAIL_APP_PASSWORD if password is None else password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.batch_size = batch_size
+        self.outbox_dir = outbox_dir
+        self.server = None
+
+    def connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        self.server = smtp_class(self.host, self.port, timeout=30)
+        if self.password:
+            self.server.login(self.from_email, self.password)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                pass
+            self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send_batch(self, message, recipients):
+        """Send one batch, reconnecting once if the server dropped the connection."""
+        if self.server is None:
+            self.connect()
+        try:
+            return self.server.sendmail(self.from_email, recipients, message)
+        except smtplib.SMTPServerDisconnected:
+            self.connect()
+            return self.server.sendmail(self.from_email, recipients, message)
+
+    def _deliver(self, message, recipients):
+        """
+        Send one batch and sort out who didn't get it.
+
+        Returns:
+            tuple: (recipients worth retrying later, {recipient: (code, reply)} for
+            recipients refused permanently)
+        """
+        try:
+            refused = self._send_batch(message, recipients)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused) as e:
+            # A rejected login or sender is ours to fix, not the recipients', so keep them queued
+            print(f"SMTP refused our login or sender ({e.smtp_code}); "
+                  f"{len(recipients)} recipient(s) kept for retry")
+            return list(recipients), {}
+        except (smtplib.SMTPException, OSError) as e:
+            print(f"Failed to send to {len(recipients)} recipient(s): {e}")
+            refused = {recipient: (getattr(e, "smtp_code", None), getattr(e, "smtp_error", b""))
+                       for recipient in recipients}
+
+        retry = [r for r, (code, _) in refused.items() if not is_permanent(code)]
+        rejected = {r: reply for r, reply in refused.items() if is_permanent(reply[0])}
+        for recipient, (code, reply) in rejected.items():
+            if isinstance(reply, bytes):
+                reply = reply.decode("utf-8", "replace")
+            print(f"Dropping {recipient}: refused permanently ({code} {reply})")
+        return retry, rejected
+
+    def send(self, message, recipients):
+        """
+        Send a rendered message to every recipient over one connection.
+
+        Args:
+            message (bytes): Output of build_digest_message.
+            recipients (list of str): Recipient addresses.
+
+        Returns:
+            dict: Counts of sent, queued (temporarily failed) and rejected
+            (permanently refused) recipients and elapsed seconds.
+        """
+        started = time.perf_counter()
+        sent, failed, rejected = 0, [], 0
+
+        for offset in range(0, len(recipients), self.batch_size):
+            batch = recipients[offset:offset + self.batch_size]
+            retry, refused = self._deliver(message, batch)
+            sent += len(batch) - len(retry) - len(refused)
+            failed.extend(retry)
+            rejected += len(refused)
+
+        if failed:
+            self.queue(message, failed)
+
+        elapsed = time.perf_counter() - started
+        rate = sent / elapsed if elapsed else float(sent)
+        print(f"Sent digest to {sent} recipient(s) in {elapsed:.2f}s ({rate:.1f} recipients/s), "
+              f"{len(failed)} queued in {self.outbox_dir}, {rejected} rejected")
+        return {"sent": sent, "queued": len(failed), "rejected": rejected, "seconds": elapsed}
+
+    def queue(self, message, recipients, attempts=0):
+        """Write a message and its undelivered recipients to the outbox."""
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        entry_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+        # The .json file marks the entry as ready, so it is written after the message
+        with open(os.path.join(self.outbox_dir, f"{entry_id}.eml"), "wb") as f:
+            f.write(message)
+        self._write_entry(os.path.join(self.outbox_dir, f"{entry_id}.json"), recipients, attempts)
+
+    def _write_entry(self, meta_path, recipients, attempts):
+        # Written atomically so a crash never leaves a half-written entry behind
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"recipients": list(recipients), "attempts": attempts}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def flush_outbox(self):
+        """
+        Retry every queued message in the outbox.
+
+        An entry is only rewritten or removed after its send attempt returns, so a
+        run killed mid-send leaves it in place for the next run. Recipients that
+        fail temporarily again are kept with the attempt count increased, and
+        dropped after MAX_OUTBOX_ATTEMPTS; permanent refusals are dropped at once.
+
+        Returns:
+            int: Number of recipients delivered from the outbox.
+        """
+        if not os.path.isdir(self.outbox_dir):
+            return 0
+
+        delivered = 0
+        for file_name in sorted(os.listdir(self.outbox_dir)):
+            if not file_name.endswith(".json"):
+                continue
+
+            entry_id = file_name[:-len(".json")]
+            meta_path = os.path.join(self.outbox_dir, file_name)
+            message_path = os.path.join(self.outbox_dir, f"{entry_id}.eml")
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    entry = json.load(f)
+                with open(message_path, "rb") as f:
+                    message = f.read()
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable outbox entry {entry_id}: {e}")
+                continue
+
+            recipients = entry["recipients"]
+            attempts = entry.get("attempts", 0) + 1
+            retry, rejected = self._deliver(message, recipients)
+
+            delivered += len(recipients) - len(retry) - len(rejected)
+            if retry and attempts < MAX_OUTBOX_ATTEMPTS:
+                self._write_entry(meta_path, retry, attempts)
+                continue
+
+            if retry:
+                print(f"Giving up on {len(retry)} recipient(s) after {attempts} attempts")
+            os.remove(meta_path)
+            os.remove(message_path)
+
+        if delivered:
+            print(f"Delivered {delivered} queued recipient(s) from {self.outbox_dir}")
+        return delivered
@@ -1,19 +1,20 @@
+import json
 import os
-from dotenv import load_dotenv
 from collections import defaultdict
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-import smtplib
-
-#load_dotenv(dotenv_path="environmentvariables.env") for local 
-load_dotenv()
-
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
+from datetime import date, datetime
+from html import escape
+from config import get_env
+from email_delivery import SMTPDelivery, build_digest_message
 
+EMAIL_USER = get_env("EMAIL_USER")
+EMAIL_APP_PASSWORD = get_env("EMAIL_APP_PASSWORD")
+DIGEST_DIR = get_env("DIGEST_DIR", "digests")
 
 class HeadlineViewer:
+    # Tkinter is only needed by the viewer, so each method imports what it uses
     def __init__(self, final_enhanced_outputs):
+        import tkinter as tk
+
         self.root = tk.Tk()
         self.root.title("News Headlines by Category")
         self.root.geometry("1200x800")
@@ -38,6 +39,9 @@ class HeadlineViewer:
         self.setup_ui()
     
     def setup_ui(self):
+        import tkinter as tk
+        from tkinter import ttk, scrolledtext
+
         # Configure root background
         self.root.configure(bg='#f0f0f0')
         
@@ -136,6 +140,8 @@ class HeadlineViewer:
             self.display_headlines(self.sorted_categories[0])
     
     def populate_categories(self, filter_text=''):
+        import tkinter as tk
+
         self.category_listbox.delete(0, tk.END)
         
         for category in self.sorted_categories:
@@ -158,6 +164,8 @@ class HeadlineViewer:
             self.display_headlines(category)
     
     def display_headlines(self, category):
+        import tkinter as tk
+
         self.headlines_text.delete('1.0', tk.END)
         
         # Update label
@@ -181,12 +189,14 @@ class HeadlineViewer:
     def run(self):
         self.root.mainloop()
 
-def generate_html_report(final_enhanced_outputs):
+def generate_html_report(final_enhanced_outputs, ranked=False):
     """
         Generates a full HTML report of news articles, categorized and styled.
 
         Args:
             final_enhanced_outputs (list): A list of tuples/iterables, each containing (category, headline, summary).
+            ranked (bool): If True, the input is already ordered by story score, and categories
+                are shown in order of their best story instead of by headline count.
 
         Returns:
             str: A single string containing the complete, formatted HTML report.
@@ -199,8 +209,11 @@ def generate_html_report(final_enhanced_outputs):
             'summary': summary or 'No summary available'
         })
 
-    # Sort by number of headlines
-    sorted_categories = sorted(category_data.keys(), key=lambda x: len(category_data[x]), reverse=True)
+    # Sort by number of headlines (dicts keep insertion order, i.e. best story first, when ranked)
+    if ranked:
+        sorted_categories = list(category_data.keys())
+    else:
+        sorted_categories = sorted(category_data.keys(), key=lambda x: len(category_data[x]), reverse=True)
 
     html = """
     <html>
@@ -225,37 +238,73 @@ def generate_html_report(final_enhanced_outputs):
     """
 
     for category in sorted_categories:
-        html += f"<div class='category'><h2>{category} ({len(category_data[category])})</h2>"
+        html += f"<div class='category'><h2>{escape(category)} ({len(category_data[category])})</h2>"
         for item in category_data[category]:
-            html += f"<div class='headline'>{item['headline']}</div>"
-            html += f"<div class='summary'>{item['summary']}</div>"
+            html += f"<div class='headline'>{escape(item['headline'])}</div>"
+            html += f"<div class='summary'>{escape(item['summary'])}</div>"
         html += "</div>"
 
     html += "</body></html>"
     return html
 
+def save_digest(final_enhanced_outputs, clusters=None, ranked=False, digest_dir=DIGEST_DIR, day=None):
+    """
+        Saves a run's digest as JSON so it can be served by web_service.py.
+
+        Args:
+            final_enhanced_outputs (list): (category, headline, summary) entries, as for generate_html_report.
+            clusters (dict): Cluster name -> list of titles from EnhancedArticleClusterer.
+            ranked (bool): Whether the entries are in story-score order.
+            digest_dir (str): Directory digests are written to, one <YYYY-MM-DD>.json per day.
+            day (date): Day of the digest (defaults to today).
+
+        Returns:
+            str: Path of the written file.
+        """
+    day = day or date.today()
+    os.makedirs(digest_dir, exist_ok=True)
+
+    digest = {
+        "day": day.isoformat(),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "ranked": ranked,
+        "entries": [
+            {"category": category, "headline": headline, "summary": summary}
+            for category, headline, summary in final_enhanced_outputs
+        ],
+        "clusters": clusters or {},
+    }
+
+    # Write atomically so the web service never reads a half-written digest
+    path = os.path.join(digest_dir, f"{day.isoformat()}.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(digest, f)
+    os.replace(path + ".tmp", path)
+    return path
+
 def send_email(html_content, to_email):
 
     """
-    Connects to the Gmail SMTP server and sends an HTML-formatted email.
+    Sends the HTML digest to one or more recipients over a single SMTP connection.
+
+    The message is rendered once and sent in batches of recipients. Previously
+    failed sends waiting in the outbox are retried first, and any recipients that
+    fail temporarily now are queued there for the next run; permanently refused
+    addresses are logged and dropped.
 
     Args:
         html_content (str): The HTML content to be used as the email body.
-        to_email (str): The email address of the recipient.
+        to_email (str or list): Recipient address, or a list of addresses.
+
+    Returns:
+        dict: Counts of sent, queued and rejected recipients and elapsed seconds.
 
     Note: The 'app_password' is used for gmail when using external scripts
     """
 
-    from_email = EMAIL_USER
-    app_password = EMAIL_APP_PASSWORD # Use Gmail App Password
-
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = "Your Morning News Digest"
-    msg["From"] = from_email
-    msg["To"] = to_email
-
-    msg.attach(MIMEText(html_content, "html"))
+    recipients = [to_email] if isinstance(to_email, str) else list(to_email)
+    message = build_digest_message(html_content, EMAIL_USER)
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(from_email, app_password)
-        server.sendmail(from_email, to_email, msg.as_string())
+    with SMTPDelivery(EMAIL_USER, EMAIL_APP_PASSWORD) as delivery:
+        delivery.flush_outbox()
+        return delivery.send(message, recipients)
@@ -0,0 +1,206 @@
+"""
+Decoding of Gemini category responses.
+
+The model is asked for a JSON object with "category_name" and "summary", but
+replies come back fenced in markdown, wrapped in prose, with trailing commas,
+single quotes or cut off part way. extract_json() recovers as much of the object
+as it can, validate_category_response() checks the fields against the schema,
+and build_repair_prompt() asks again for only the fields that are still broken.
+
+Run `python llm_parsing.py` to replay the recorded bad responses in
+llm_response_corpus.json and check they still decode as expected.
+"""
+
+import ast
+import json
+import re
+
+_FENCE_PATTERN = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_FIELD_PATTERN = '"{}"\\s*:\\s*"((?:[^"\\\\]|\\\\.)*)'
+
+MAX_CATEGORY_NAME_LENGTH = 80
+
+# field -> (description used in repair prompts, validator)
+CATEGORY_SCHEMA = {
+    "category_name": (
+        "a short, specific news category name, e.g. oil finance, sustainable energy",
+        lambda v: isinstance(v, str) and 0 < len(v.strip()) <= MAX_CATEGORY_NAME_LENGTH
+        and "\n" not in v.strip(),
+    ),
+    "summary": (
+        "a one-sentence summary of the main topic",
+        lambda v: isinstance(v, str) and len(v.strip()) > 0,
+    ),
+}
+
+
+def _close_truncated(text):
+    """Close any string, object or array left open by a truncated reply."""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    # Drop a dangling key or separator such as `, "summary"` or `"summary":`
+    text = re.sub(r'(,\s*"[^"]*"\s*:?\s*|,\s*|:\s*)$', "", text.rstrip())
+    return text + "".join(reversed(stack))
+
+
+def _loads(candidate):
+    for attempt in (candidate, _TRAILING_COMMA_PATTERN.sub(r"\1", candidate)):
+        try:
+            return json.loads(attempt)
+        except ValueError:
+            pass
+    try:
+        # Python-style dicts with single quotes
+        return ast.literal_eval(candidate)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _decode_object(text):
+    fence = _FENCE_PATTERN.search(text)
+    if fence:
+        text = fence.group(1).strip()
+
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    candidate = text[start:]
+    end = candidate.rfind("}")
+    for attempt in (candidate[:end + 1] if end != -1 else None, _close_truncated(candidate)):
+        if attempt:
+            data = _loads(attempt)
+            if isinstance(data, dict):
+                return data
+    return None
+
+
+def extract_json(text):
+    """
+    Recover a JSON object from a free-form LLM reply.
+
+    Handles markdown fences, prose before/after the object, smart quotes,
+    trailing commas, single-quoted keys and truncated output. As a last resort
+    individual string fields are pulled out with a regex.
+
+    Args:
+        text (str): Raw model output.
+
+    Returns:
+        dict: The decoded object, or whatever fields could be recovered (possibly empty).
+    """
+    if not text:
+        return {}
+
+    text = text.strip()
+    # Smart quotes are only swapped in if the reply doesn't decode as it is,
+    # since curly quotes inside a well-formed string value are legitimate.
+    for attempt in (text, text.translate(_SMART_QUOTES)):
+        data = _decode_object(attempt)
+        if data is not None:
+            return data
+
+    text = text.translate(_SMART_QUOTES)
+    fields = {}
+    for field in CATEGORY_SCHEMA:
+        match = re.search(_FIELD_PATTERN.format(field), text)
+        if match:
+            try:
+                fields[field] = json.loads(f'"{match.group(1)}"')
+            except ValueError:
+                fields[field] = match.group(1)
+    return fields
+
+
+def validate_category_response(data, fields=None):
+    """
+    Check a decoded response against CATEGORY_SCHEMA.
+
+    Args:
+        data (dict): Output of extract_json.
+        fields (list): Fields to check (defaults to every schema field).
+
+    Returns:
+        tuple: (dict of valid, stripped fields, list of missing or invalid field names)
+    """
+    fields = fields or list(CATEGORY_SCHEMA)
+    valid, broken = {}, []
+    for field in fields:
+        value = data.get(field) if isinstance(data, dict) else None
+        if CATEGORY_SCHEMA[field][1](value):
+            valid[field] = value.strip()
+        else:
+            broken.append(field)
+    return valid, broken
+
+
+def build_repair_prompt(headline, description, broken_fields, valid_fields=None):
+    """
+    Build a short follow-up prompt asking only for the fields that failed validation.
+
+    Args:
+        headline (str): The article headline.
+        description (str): The article description.
+        broken_fields (list): Field names to ask for again.
+        valid_fields (dict): Fields already recovered, given as context.
+
+    Returns:
+        str: The repair prompt.
+    """
+    wanted = "\n".join(f'    "{field}": {CATEGORY_SCHEMA[field][0]}' for field in broken_fields)
+    known = ""
+    if valid_fields:
+        known = f"\nAlready determined: {json.dumps(valid_fields)}\n"
+
+    return f"""
+    Return ONLY a JSON object, with no markdown and no other text, containing these keys:
+{wanted}
+    {known}
+    Headline: {headline}
+    Description: {description}
+    """
+
+
+def replay_corpus(path="llm_response_corpus.json"):
+    """
+    Decode every recorded response in the corpus and compare with its expected result.
+
+    Returns:
+        int: Number of mismatches.
+    """
+    with open(path, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    mismatches = 0
+    for case in corpus:
+        valid, broken = validate_category_response(extract_json(case["raw"]))
+        if valid != case["expected"] or broken != case["broken"]:
+            mismatches += 1
+            print(f"MISMATCH {case['name']}: got {valid} broken={broken}, "
+                  f"expected {case['expected']} broken={case['broken']}")
+
+    print(f"{len(corpus) - mismatches}/{len(corpus)} recorded responses decoded as expected")
+    return mismatches
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if replay_corpus() else 0)
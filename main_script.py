@@ -1,47 +1,63 @@
 from data_extraction import get_headlines_from_newsio, get_top_headlines_from_news_api, fetch_gnews_articles
 from data_formatting import filter_english_articles_and_duplicate, consolidate_dataframe
-from clustering import EnhancedArticleClusterer, determine_category_for_cluster, make_categorisations
-from interaction import HeadlineViewer, generate_html_report, send_email
-
-import os
-from dotenv import load_dotenv
-#load_dotenv(dotenv_path="environmentvariables.env") # for local 
-load_dotenv()
-
-NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
-NEWSIOAPI_KEY = os.getenv("NEWSIOAPI_KEY")
-GNEWSAPI_KEY = os.getenv("GNEWSAPI_KEY")
-GOOGLE_API = os.getenv("GOOGLE_API")
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
-
-
-#headline extraction
-concat_headlines_news_api = get_top_headlines_from_news_api(verbose = True)
-newsio_headlines = get_headlines_from_newsio()
-concat_gnews_articles = fetch_gnews_articles()
-
-#data cleaning 
-articles_news_api_cleaned = filter_english_articles_and_duplicate(concat_headlines_news_api)
-articles_newsio_cleaned = filter_english_articles_and_duplicate(newsio_headlines)
-articles_gnews_cleaned = filter_english_articles_and_duplicate(concat_gnews_articles)
-
-#consolidate dataframes
-full_articles_database = consolidate_dataframe(
-    articles_news_api_cleaned,
-    articles_newsio_cleaned,
-    articles_gnews_cleaned
-)
-
-#clustering of data headlines
-clusterer = EnhancedArticleClusterer(n_clusters='auto', method='kmeans', 
-                                       category_weight=3)
-clusters = clusterer.cluster_articles(full_articles_database)
-clusterer.print_clusters_with_categories()
-
-#determine categories for clusters
-final_filtered_data = make_categorisations(full_articles_database)
-
-#interactions for email
-html = generate_html_report(final_filtered_data)
-send_email(html, EMAIL_USER)
\ No newline at end of file
+from clustering import EnhancedArticleClusterer, make_categorisations
+from interaction import generate_html_report, save_digest, send_email
+from scoring import select_top_stories
+from resilient_client import ResilientClient, Deadline
+from memory_budget import track_stage
+from config import get_env
+
+EMAIL_USER = get_env("EMAIL_USER")
+EMAIL_RECIPIENTS = [r.strip() for r in get_env("EMAIL_RECIPIENTS", EMAIL_USER or "").split(",") if r.strip()]
+FETCH_DEADLINE_SECONDS = float(get_env("FETCH_DEADLINE_SECONDS", "600"))
+TOP_N_STORIES = int(get_env("TOP_N_STORIES", "0"))  # 0 keeps every article
+
+
+def main():
+    #headline extraction (one deadline for the whole fetch phase; partial results are kept)
+    with track_stage("fetch"):
+        client = ResilientClient(deadline=Deadline(FETCH_DEADLINE_SECONDS))
+        concat_headlines_news_api = get_top_headlines_from_news_api(verbose = True, client=client)
+        newsio_headlines = get_headlines_from_newsio(client=client)
+        concat_gnews_articles = fetch_gnews_articles(client=client)
+        client.close()
+
+    #data cleaning 
+    with track_stage("filter"):
+        articles_news_api_cleaned = filter_english_articles_and_duplicate(concat_headlines_news_api)
+        articles_newsio_cleaned = filter_english_articles_and_duplicate(newsio_headlines)
+        articles_gnews_cleaned = filter_english_articles_and_duplicate(concat_gnews_articles)
+    del concat_headlines_news_api, newsio_headlines, concat_gnews_articles
+
+    #consolidate dataframes
+    full_articles_database = consolidate_dataframe(
+        articles_news_api_cleaned,
+        articles_newsio_cleaned,
+        articles_gnews_cleaned
+    )
+
+    #clustering of data headlines (out of core when MEMORY_BUDGET_MB is set)
+    with track_stage("cluster"):
+        clusterer = EnhancedArticleClusterer(n_clusters='auto', method='kmeans', 
+                                               category_weight=3)
+        clusters = clusterer.cluster_articles(full_articles_database)
+    clusterer.print_clusters_with_categories()
+
+    #rank stories and keep only the top N for the LLM and the digest
+    if TOP_N_STORIES:
+        with track_stage("rank"):
+            full_articles_database = select_top_stories(full_articles_database, TOP_N_STORIES)
+
+    #determine categories for clusters
+    with track_stage("categorise"):
+        final_filtered_data = make_categorisations(full_articles_database)
+
+    #interactions for email
+    with track_stage("deliver"):
+        html = generate_html_report(final_filtered_data, ranked=bool(TOP_N_STORIES))
+        save_digest(final_filtered_data, clusters, ranked=bool(TOP_N_STORIES))
+        send_email(html, EMAIL_RECIPIENTS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Memory accounting for large runs.
+
+Set MEMORY_BUDGET_MB in your .env to cluster articles out of core: texts are
+vectorised in chunks, and intermediate arrays are written to memory-mapped files
+under SPILL_DIR (a temporary directory by default) once the process would go
+over the budget. track_stage() prints the peak resident memory of each pipeline
+stage so the budget can be sized from a real run.
+
+Stage peaks are exact on Linux: the kernel's high-water mark (VmHWM) is reset
+through /proc/self/clear_refs when a stage starts. Where it can't be reset, the
+resident size is sampled from a background thread instead.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from config import get_env
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MEMORY_BUDGET_MB = float(get_env("MEMORY_BUDGET_MB", "0"))  # 0 keeps everything in memory
+SPILL_DIR = get_env("SPILL_DIR")
+
+MB = 1024 * 1024
+SAMPLE_INTERVAL = 0.05  # seconds between RSS samples where VmHWM can't be reset
+
+# PeakRss blocks currently open, innermost last
+_open_blocks = []
+
+
+def peak_rss_bytes():
+    """Highest resident set size of this process so far, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _proc_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def current_rss_bytes():
+    """Current resident set size, falling back to the peak where /proc isn't available."""
+    rss = _proc_rss_bytes()
+    return peak_rss_bytes() if rss is None else rss
+
+
+def _high_water_mark_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_high_water_mark():
+    """Reset VmHWM to the current RSS (Linux); False where that isn't possible."""
+    if _high_water_mark_bytes() is None:
+        return False
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class PeakRss:
+    """
+    Peak resident set size of this process while a block runs.
+
+    After the block, `peak_bytes` is the block's own peak and `start_bytes` the
+    RSS it started from (both None where RSS can't be read). Blocks may be nested.
+    """
+
+    def __enter__(self):
+        self.start_bytes = _proc_rss_bytes()
+        self.peak_bytes = None
+        self._inner_peak = 0
+        self._sampler = None
+
+        if self.start_bytes is not None:
+            high_water_mark = _high_water_mark_bytes()
+            if _reset_high_water_mark():
+                # The reset hides the enclosing blocks' peak so far, so hand it to them
+                _record_inner_peak(high_water_mark)
+            else:
+                self._samples = [self.start_bytes]
+                self._stop = threading.Event()
+                self._sampler = threading.Thread(target=self._sample, daemon=True)
+                self._sampler.start()
+
+        _open_blocks.append(self)
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._samples.append(_proc_rss_bytes() or 0)
+
+    def __exit__(self, *exc):
+        _open_blocks.remove(self)
+        if self.start_bytes is None:
+            return
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            peak = max(self._samples + [_proc_rss_bytes() or 0])
+        else:
+            peak = _high_water_mark_bytes() or 0
+
+        self.peak_bytes = max(peak, self._inner_peak)
+        _record_inner_peak(self.peak_bytes)
+
+
+def _record_inner_peak(peak):
+    for block in _open_blocks:
+        block._inner_peak = max(block._inner_peak, peak)
+
+
+@contextmanager
+def track_stage(name):
+    """
+    Print the elapsed time and peak RSS of a pipeline stage.
+
+    Args:
+        name (str): Stage name used in the printed line.
+    """
+    rss = PeakRss()
+    started = time.perf_counter()
+    try:
+        with rss:
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if rss.peak_bytes is None:
+            print(f"[memory] {name}: {elapsed:.1f}s (peak RSS unavailable on this platform)")
+        else:
+            print(f"[memory] {name}: peak RSS {rss.peak_bytes / MB:.0f} MB "
+                  f"(+{(rss.peak_bytes - rss.start_bytes) / MB:.0f} MB) in {elapsed:.1f}s")
+
+
+class MemoryBudget:
+    def __init__(self, limit_mb=MEMORY_BUDGET_MB, spill_dir=SPILL_DIR):
+        """
+        Decide when intermediate arrays should go to disk instead of RAM.
+
+        Args:
+            limit_mb (float): Resident memory budget in MB (0 or None for no limit).
+            spill_dir (str): Parent directory for spill files (defaults to the system temp dir).
+        """
+        self.limit_bytes = int(limit_mb * MB) if limit_mb else None
+        self.spill_dir = spill_dir
+        self.spilled_bytes = 0
+        self._directory = None
+        self._files = 0
+
+    def exceeded(self, extra_bytes=0):
+        """True if the process, plus `extra_bytes` more, would be over the budget."""
+        if self.limit_bytes is None:
+            return False
+        rss = current_rss_bytes() or 0
+        return rss + extra_bytes > self.limit_bytes
+
+    def _path(self, name):
+        if self._directory is None:
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok=True)
+            self._directory = tempfile.mkdtemp(prefix="news_spill_", dir=self.spill_dir)
+        self._files += 1
+        return os.path.join(self._directory, f"{self._files:05d}_{name}.npy")
+
+    def keep(self, array, name="array"):
+        """
+        Return `array` unchanged if it fits in the budget, otherwise a read-only
+        memory-mapped copy of it backed by a spill file.
+        """
+        if not self.exceeded(array.nbytes):
+            return array
+        import numpy as np
+
+        path = self._path(name)
+        np.save(path, array)
+        self.spilled_bytes += array.nbytes
+        return np.load(path, mmap_mode="r")
+
+    def empty(self, shape, dtype, name="array"):
+        """An uninitialised array, memory-mapped to a spill file if it doesn't fit in the budget."""
+        import numpy as np
+
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not self.exceeded(nbytes):
+            return np.empty(shape, dtype=dtype)
+        self.spilled_bytes += nbytes
+        return np.lib.format.open_memmap(self._path(name), mode="w+", dtype=dtype, shape=shape)
+
+    def cleanup(self):
+        """Delete every spill file (arrays returned by keep/empty must no longer be used)."""
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
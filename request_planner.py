@@ -0,0 +1,158 @@
+"""
+Plans provider requests so a run covers every source and country with as few
+calls as the providers allow, then spends whatever is left of the daily quota on
+further result pages.
+
+    - NewsAPI accepts a comma-separated `sources` list and pages with `page`.
+    - NewsData.io accepts several comma-separated countries and pages with `nextPage`.
+    - GNews only accepts one country per call, but pages with `page` on paid plans.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from datetime import date
+
+from config import get_env
+from resilient_client import DeadlineExceeded
+
+NEWSAPI_MAX_SOURCES_PER_REQUEST = 20
+NEWSAPI_PAGE_SIZE = 100
+NEWSIO_MAX_COUNTRIES_PER_REQUEST = 5
+
+DAILY_QUOTAS = {
+    "newsapi": int(get_env("NEWSAPI_DAILY_QUOTA", "100")),
+    "newsio": int(get_env("NEWSIO_DAILY_QUOTA", "200")),
+    "gnews": int(get_env("GNEWS_DAILY_QUOTA", "100")),
+}
+# Upper bound on calls per provider in a single run, so one run can't drain the day
+RUN_QUOTAS = {
+    "newsapi": int(get_env("NEWSAPI_RUN_QUOTA", "10")),
+    "newsio": int(get_env("NEWSIO_RUN_QUOTA", "30")),
+    "gnews": int(get_env("GNEWS_RUN_QUOTA", "30")),
+}
+QUOTA_STATE_PATH = get_env("QUOTA_STATE_PATH", "quota_state.json")
+
+
+def chunked(items, size):
+    """Split a list into consecutive lists of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class DailyQuota:
+    def __init__(self, provider, daily_limit=None, run_limit=None, state_path=QUOTA_STATE_PATH):
+        """
+        Track how many calls a provider has left today.
+
+        Usage is persisted to `state_path` so several runs on the same day share
+        the provider's daily allowance. The counter resets when the date changes.
+
+        Args:
+            provider (str): 'newsapi', 'newsio' or 'gnews'.
+            daily_limit (int): Calls allowed per day (defaults to DAILY_QUOTAS).
+            run_limit (int): Calls allowed in this run (defaults to RUN_QUOTAS).
+            state_path (str): JSON file holding today's usage, or None to keep it in memory.
+        """
+        self.provider = provider
+        self.daily_limit = DAILY_QUOTAS[provider] if daily_limit is None else daily_limit
+        self.run_limit = RUN_QUOTAS[provider] if run_limit is None else run_limit
+        self.state_path = state_path
+        self.used_this_run = 0
+        self.used_today = self._load_used_today()
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return state if state.get("date") == date.today().isoformat() else {}
+
+    def _load_used_today(self):
+        return self._load_state().get("used", {}).get(self.provider, 0)
+
+    @property
+    def remaining(self):
+        return max(0, min(self.daily_limit - self.used_today, self.run_limit - self.used_this_run))
+
+    def consume(self):
+        """Record one call against the quota."""
+        self.used_this_run += 1
+        self.used_today += 1
+
+        if not self.state_path:
+            return
+        state = self._load_state()
+        state["date"] = date.today().isoformat()
+        state.setdefault("used", {})[self.provider] = self.used_today
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+
+def run_plan(batches, fetch_page, quota, delay=0, verbose=False, deadline=None):
+    """
+    Fetch every batch's first page, then follow pagination while quota remains.
+
+    Pages are taken breadth-first: every batch gets its first page before any
+    batch gets a second one, so a tight quota still covers every source/country.
+
+    Args:
+        batches (list): Request batches (e.g. lists of sources or countries).
+        fetch_page (callable): fetch_page(batch, cursor, page_number) returning
+            (articles, next_cursor). cursor is None for the first page; a
+            next_cursor of None means there are no more pages. fetch_page charges
+            `quota` for every HTTP request it actually sends, e.g. by passing
+            quota.consume to ResilientClient.get_json as on_request, so retries
+            are paid for and pages skipped by an open circuit are not.
+        quota (DailyQuota): Quota checked before each page is started.
+        delay (float): Seconds to sleep between calls.
+        verbose (bool): If True, prints the plan and quota usage.
+        deadline (Deadline): Stop starting new calls once this passes; articles
+            fetched so far are still returned. fetch_page may also raise
+            DeadlineExceeded to stop the plan.
+
+    Returns:
+        list: All articles returned by the fetched pages.
+    """
+    queue = deque((batch, None, 1) for batch in batches)
+    articles = []
+    calls = 0
+
+    if verbose:
+        print(f"[{quota.provider}] {len(batches)} batched request(s), "
+              f"{quota.remaining} call(s) available")
+
+    while queue:
+        if quota.remaining <= 0:
+            print(f"[{quota.provider}] Quota exhausted with {len(queue)} page(s) left unfetched")
+            break
+
+        if calls and delay:
+            if deadline:
+                deadline.sleep(delay)
+            else:
+                time.sleep(delay)
+        if deadline and deadline.expired():
+            print(f"[{quota.provider}] Fetch deadline reached with {len(queue)} page(s) left unfetched")
+            break
+
+        batch, cursor, page_number = queue.popleft()
+        calls += 1
+        try:
+            page_articles, next_cursor = fetch_page(batch, cursor, page_number)
+        except DeadlineExceeded:
+            print(f"[{quota.provider}] Fetch deadline reached with {len(queue)} page(s) left unfetched")
+            break
+        articles.extend(page_articles)
+
+        if next_cursor is not None and page_articles:
+            queue.append((batch, next_cursor, page_number + 1))
+
+    if verbose:
+        print(f"[{quota.provider}] {calls} page(s) requested in {quota.used_this_run} call(s), "
+              f"{len(articles)} articles retrieved")
+
+    return articles
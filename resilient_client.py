@@ -0,0 +1,232 @@
+"""
+Shared HTTP client for the news providers.
+
+Every request gets connect/read timeouts, jittered exponential retries on
+transient failures (connection errors, timeouts, 429 and 5xx), a circuit breaker
+per endpoint so a provider that is down fails fast, and an optional global
+deadline for the whole fetch phase. Slow requests can optionally be hedged with
+a second identical request.
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit
+
+import requests
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the fetch phase has run out of time."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when an endpoint's circuit breaker is rejecting requests."""
+
+
+class Deadline:
+    def __init__(self, seconds=None):
+        """
+        A point in time after which no new requests should be started.
+
+        Args:
+            seconds (float): Time budget from now, or None for no deadline.
+        """
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left, or None if there is no deadline."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def sleep(self, seconds):
+        """Sleep for up to `seconds`, never past the deadline."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        """
+        Stops calling an endpoint after repeated failures.
+
+        After `failure_threshold` consecutive failures the circuit opens and calls
+        are rejected for `reset_timeout` seconds. The next call after that is let
+        through as a trial: success closes the circuit, failure reopens it.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class ResilientClient:
+    def __init__(self, connect_timeout=5.0, read_timeout=15.0, max_retries=3,
+                 backoff_base=1.0, backoff_max=30.0, failure_threshold=5,
+                 reset_timeout=60.0, deadline=None, hedge_after=None, session=None):
+        """
+        Initialise the client.
+
+        Args:
+            connect_timeout (float): Seconds allowed to establish a connection.
+            read_timeout (float): Seconds allowed between bytes of the response.
+            max_retries (int): Retries after the first attempt for transient failures.
+            backoff_base (float): First retry waits up to this many seconds; doubles each retry.
+            backoff_max (float): Cap on a single backoff wait.
+            failure_threshold (int): Consecutive failures before an endpoint's circuit opens.
+            reset_timeout (float): Seconds an open circuit waits before a trial request.
+            deadline (Deadline): Global deadline shared by every request made by this client.
+            hedge_after (float): If set, send a duplicate request when the first has not
+                answered after this many seconds and use whichever finishes first.
+                Hedged requests count against provider quotas, so this is off by default.
+            session (requests.Session): Session to reuse (one is created if omitted).
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.deadline = deadline or Deadline()
+        self.hedge_after = hedge_after
+        self.session = session or requests.Session()
+        self.breakers = {}
+        self._executor = ThreadPoolExecutor(max_workers=4) if hedge_after else None
+
+    def breaker_for(self, url):
+        parts = urlsplit(url)
+        endpoint = f"{parts.netloc}{parts.path}"
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[endpoint]
+
+    def _timeout(self):
+        remaining = self.deadline.remaining()
+        if remaining is None:
+            return (self.connect_timeout, self.read_timeout)
+        if remaining <= 0:
+            raise DeadlineExceeded("Fetch deadline passed")
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+    def _send(self, url, params, on_request=None):
+        timeout = self._timeout()
+        if on_request:
+            on_request()
+        if not self._executor:
+            return self.session.get(url, params=params, timeout=timeout)
+
+        first = self._executor.submit(self.session.get, url, params=params, timeout=timeout)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        if on_request:
+            on_request()
+        second = self._executor.submit(self.session.get, url, params=params, timeout=timeout)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except requests.RequestException as e:
+                    error = e
+        raise error
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            wait_seconds = min(float(retry_after), self.backoff_max)
+        else:
+            # Full jitter: uniform between 0 and the exponential cap
+            wait_seconds = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        self.deadline.sleep(wait_seconds)
+
+    def get_json(self, url, params=None, on_request=None):
+        """
+        GET a URL and decode the JSON body, retrying transient failures.
+
+        Args:
+            url (str): Endpoint URL.
+            params (dict): Query parameters.
+            on_request (callable): Called with no arguments for every HTTP request
+                actually sent, retries and hedged duplicates included (e.g.
+                DailyQuota.consume). Calls rejected by an open circuit or the
+                deadline send nothing and aren't reported.
+
+        Returns:
+            dict: Decoded JSON response.
+
+        Raises:
+            DeadlineExceeded: The global deadline passed before a response was obtained.
+            CircuitOpenError: The endpoint's circuit breaker is open.
+            requests.RequestException: A non-retryable error, or retries ran out.
+        """
+        breaker = self.breaker_for(url)
+
+        for attempt in range(self.max_retries + 1):
+            if self.deadline.expired():
+                raise DeadlineExceeded(f"Fetch deadline passed before calling {url}")
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {urlsplit(url).netloc}")
+
+            response = None
+            try:
+                response = self._send(url, params, on_request)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                print(f"Transient error ({e.__class__.__name__}), retry {attempt + 1}/{self.max_retries}")
+                self._backoff(attempt)
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                print(f"HTTP {response.status_code}, retry {attempt + 1}/{self.max_retries}")
+                self._backoff(attempt, response)
+                continue
+
+            # Other 4xx responses are our fault (bad key, bad params), not the endpoint's
+            if response.status_code < 500:
+                breaker.record_success()
+            response.raise_for_status()
+            return response.json()
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,290 @@
+"""
+Market-relevance scoring of the day's stories.
+
+Articles are grouped into near-duplicate stories (the same event carried by
+several outlets), and each story is scored on
+    - coverage: how many providers and distinct outlets carried it,
+    - growth: how much more its key words appear today than over previous days,
+    - watchlist hits: tickers, companies, commodities and macro terms, matched
+      with a precomputed Aho-Corasick automaton in a single pass per story.
+
+select_top_stories() keeps the best N stories so only those are sent to the LLM
+and included in the digest.
+"""
+
+import json
+import math
+import os
+from collections import Counter, defaultdict, deque
+from datetime import date
+
+from config import get_env
+from text_normalisation import normalise_batch, normalise_text
+
+WATCHLIST_PATH = get_env("WATCHLIST_PATH", "watchlist.json")
+STORY_HISTORY_PATH = get_env("STORY_HISTORY_PATH", "story_history.json")
+HISTORY_DAYS = 7
+
+COVERAGE_PROVIDER_WEIGHT = 2.0
+COVERAGE_OUTLET_WEIGHT = 1.0
+GROWTH_WEIGHT = 1.5
+MAX_WATCHLIST_SCORE = 3.0
+
+# term -> weight; extended or overridden by WATCHLIST_PATH if it exists
+DEFAULT_WATCHLIST = {
+    # commodities
+    "oil": 1.0, "brent": 1.0, "crude": 1.0, "opec": 1.0, "natural gas": 1.0, "gold": 1.0,
+    "copper": 1.0, "lithium": 1.0, "wheat": 0.5, "iron ore": 1.0,
+    # macro
+    "interest rate": 1.0, "interest rates": 1.0, "inflation": 1.0, "federal reserve": 1.0,
+    "fed": 0.5, "ecb": 1.0, "bank of england": 1.0, "recession": 1.0, "tariff": 1.0,
+    "tariffs": 1.0, "gdp": 1.0, "bond yields": 1.0, "sanctions": 0.5,
+    # markets and companies
+    "stocks": 0.5, "shares": 0.5, "earnings": 1.0, "ipo": 1.0, "merger": 1.0,
+    "acquisition": 1.0, "s p 500": 1.0, "nasdaq": 1.0, "dow jones": 1.0, "ftse": 1.0,
+    "nvidia": 1.0, "apple": 1.0, "microsoft": 1.0, "tesla": 1.0, "amazon": 1.0,
+    "alphabet": 1.0, "meta": 0.5, "tsmc": 1.0, "aapl": 1.0, "nvda": 1.0, "tsla": 1.0,
+    "msft": 1.0, "amzn": 1.0,
+}
+
+# Ignored when deciding whether two headlines describe the same story
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "at", "by", "with",
+    "from", "as", "is", "are", "was", "were", "be", "been", "after", "over", "into",
+    "its", "it", "that", "this", "says", "say", "said", "new", "will", "has", "have",
+}
+
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        """
+        Build a matcher for many patterns at once.
+
+        Args:
+            patterns (dict): pattern -> weight. Patterns are normalised the same
+                way as the text they are matched against.
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, weight in patterns.items():
+            pattern = normalise_text(pattern)
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((pattern, weight))
+
+        # Breadth-first pass to fill in failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """
+        Return every pattern found in a normalised text as a whole word or phrase.
+
+        Returns:
+            dict: pattern -> weight for each pattern that occurs.
+        """
+        found = {}
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern, weight in self.output[state]:
+                start = end - len(pattern) + 1
+                before_ok = start == 0 or text[start - 1] == " "
+                after_ok = end + 1 == len(text) or text[end + 1] == " "
+                if before_ok and after_ok:
+                    found[pattern] = weight
+        return found
+
+
+def load_watchlist(path=WATCHLIST_PATH):
+    """Default watchlist, updated with {term: weight} entries from `path` if it exists."""
+    watchlist = dict(DEFAULT_WATCHLIST)
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            watchlist.update(json.load(f))
+    return watchlist
+
+
+def story_tokens(normalised_title):
+    return frozenset(t for t in normalised_title.split() if t not in STOPWORDS and len(t) > 1)
+
+
+def group_near_duplicates(articles, threshold=0.5):
+    """
+    Group articles whose headlines share most of their significant words.
+
+    Args:
+        articles (list of dict): Articles with 'title' and 'description'.
+        threshold (float): Minimum Jaccard overlap with a group's first headline.
+
+    Returns:
+        list of list of int: Indices into `articles`, one list per story.
+    """
+    groups = []
+    group_tokens = []
+    token_index = defaultdict(set)
+
+    for i, normalised in enumerate(normalise_batch(articles)):
+        tokens = story_tokens(normalised.title)
+
+        candidates = set()
+        for token in tokens:
+            candidates |= token_index.get(token, set())
+
+        best, best_score = None, 0.0
+        for g in candidates:
+            score = len(tokens & group_tokens[g]) / len(tokens | group_tokens[g])
+            if score > best_score:
+                best, best_score = g, score
+
+        if best is not None and best_score >= threshold:
+            groups[best].append(i)
+        else:
+            groups.append([i])
+            group_tokens.append(tokens)
+            for token in tokens:
+                token_index[token].add(len(groups) - 1)
+
+    return groups
+
+
+def load_history(path=STORY_HISTORY_PATH):
+    """Previous days' headline word counts: {YYYY-MM-DD: {word: count}}."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_history(history, today_counts, path=STORY_HISTORY_PATH, day=None):
+    """Add today's word counts and keep only the last HISTORY_DAYS days."""
+    if not path:
+        return
+    history = dict(history)
+    history[(day or date.today()).isoformat()] = dict(today_counts)
+    kept = dict(sorted(history.items())[-HISTORY_DAYS:])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(kept, f)
+
+
+def rank_stories(articles, history=None, watchlist=None, day=None):
+    """
+    Group articles into stories and score them.
+
+    Args:
+        articles (list of dict): Articles with 'title', 'description' and
+            optionally 'provider', 'source' and 'sources'.
+        history (dict): Output of load_history (previous days only are used).
+        watchlist (dict): term -> weight (defaults to load_watchlist()).
+        day (date): The day being scored (defaults to today).
+
+    Returns:
+        tuple: (list of story dicts sorted by descending score, today's word counts).
+            Each story has 'article' (the representative), 'size', 'providers',
+            'outlets', 'growth', 'watchlist' and 'score'.
+    """
+    day_key = (day or date.today()).isoformat()
+    previous_days = [counts for d, counts in (history or {}).items() if d < day_key]
+    matcher = AhoCorasick(load_watchlist() if watchlist is None else watchlist)
+    normalised = normalise_batch(articles)
+
+    groups = group_near_duplicates(articles)
+    signatures = [story_tokens(normalised[members[0]].title) for members in groups]
+
+    # Word counts are per story, so one story carried by 20 outlets counts once
+    today_counts = Counter()
+    for signature in signatures:
+        today_counts.update(signature)
+
+    stories = []
+    for members, signature in zip(groups, signatures):
+        providers = {articles[i].get("provider") for i in members} - {None}
+        # Title dedup folds identical wire headlines into one article listing their 'sources'
+        outlets = {
+            outlet for i in members
+            for outlet in articles[i].get("sources") or [articles[i].get("source")]
+        } - {None}
+
+        growth = 0.0
+        if signature and previous_days:
+            before = sum(
+                sum(counts.get(t, 0) for t in signature) / len(signature) for counts in previous_days
+            ) / len(previous_days)
+            now = sum(today_counts[t] for t in signature) / len(signature)
+            growth = max(0.0, math.log1p(now) - math.log1p(before))
+
+        hits = {}
+        for i in members:
+            hits.update(matcher.find(normalised[i].weighted_text))
+
+        score = (
+            COVERAGE_PROVIDER_WEIGHT * len(providers)
+            + COVERAGE_OUTLET_WEIGHT * math.log1p(max(len(outlets), len(members)))
+            + GROWTH_WEIGHT * growth
+            + min(MAX_WATCHLIST_SCORE, sum(hits.values()))
+        )
+        stories.append({
+            "article": articles[members[0]],
+            "size": len(members),
+            "providers": sorted(providers),
+            "outlets": sorted(outlets),
+            "growth": round(growth, 3),
+            "watchlist": sorted(hits),
+            "score": round(score, 3),
+        })
+
+    stories.sort(key=lambda story: story["score"], reverse=True)
+    return stories, today_counts
+
+
+def select_top_stories(articles, top_n, history_path=STORY_HISTORY_PATH, verbose=True):
+    """
+    Keep the representative article of the `top_n` highest-scoring stories.
+
+    Today's word counts are saved to the history so tomorrow's growth can be measured.
+
+    Args:
+        articles (list of dict): The day's consolidated articles.
+        top_n (int): Number of stories to keep.
+        history_path (str): Where daily word counts are kept (None to skip).
+        verbose (bool): If True, prints the ranked stories.
+
+    Returns:
+        list of dict: Representative articles in descending score order.
+    """
+    history = load_history(history_path)
+    stories, today_counts = rank_stories(articles, history)
+    save_history(history, today_counts, history_path)
+
+    top = stories[:top_n]
+    if verbose:
+        print(f"\nTop {len(top)} of {len(stories)} stories ({len(articles)} articles):")
+        for rank, story in enumerate(top, 1):
+            watch = f" [{', '.join(story['watchlist'])}]" if story["watchlist"] else ""
+            print(f"{rank}. ({story['score']:.2f}, {story['size']} articles, "
+                  f"{len(story['providers'])} providers) {story['article']['title']}{watch}")
+
+    return [story["article"] for story in top]
@@ -0,0 +1,283 @@
+"""
+Canonical category buckets for the free-text labels Gemini returns.
+
+"Oil Finance", "oil markets" and "Energy - Oil" all describe the same section of
+the digest. CategoryTaxonomy maps each raw label onto a growing list of canonical
+labels: first by an exact match on a key of stemmed words, then by nesting
+("Crude Oil" extends "Oil" only with another energy subject), and finally (when
+sentence-transformers is installed) by embedding similarity. Anything that matches nothing becomes a new
+canonical label. Results are cached per raw label and the taxonomy is persisted
+between runs.
+
+Run `python taxonomy.py` to check the recorded merge/keep-apart cases in
+REGRESSION_CASES.
+"""
+
+import json
+import os
+import re
+from collections import defaultdict
+from importlib.util import find_spec
+
+from config import get_env
+from text_normalisation import normalise_text
+
+TAXONOMY_PATH = get_env("TAXONOMY_PATH", "category_taxonomy.json")
+EMBEDDING_MODEL = get_env("TAXONOMY_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Categories left out of the digest entirely
+EXCLUDED_CATEGORY_TERMS = ["sport", "sports", "motorsport", "lottery", "lotteries", "music"]
+EXCLUDED_CATEGORY_PATTERN = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, EXCLUDED_CATEGORY_TERMS)) + r")\b", re.IGNORECASE
+)
+
+# Words that qualify a topic without changing it ("oil markets" is about oil)
+GENERIC_TERMS = {
+    "news", "and", "the", "of", "in", "update", "updates", "finance", "financial",
+    "market", "markets", "industry", "sector", "prices", "price", "affairs", "issues",
+}
+# Spellings of one topic, reduced to a single word before matching
+TERM_SYNONYMS = {
+    "technology": "tech", "technological": "tech", "economic": "economy",
+    "economics": "economy", "political": "politics", "commodity": "commodities",
+    "equities": "stocks", "equity": "stocks", "shares": "stocks",
+}
+# Parent domains and the subjects filed under them. The domain word is dropped only
+# in front of one of its own subjects ("Energy - Oil" is about oil). Next to a
+# place or a qualifier ("US Economy", "Tech Policy") it is what tells sections
+# apart, so it stays in the key.
+DOMAIN_SUBJECTS = {
+    "energy": ["oil", "gas", "crude", "lng", "opec", "coal", "power", "electricity",
+               "renewables", "solar", "wind", "nuclear", "refining"],
+    "commodities": ["oil", "gas", "crude", "gold", "silver", "copper", "metals",
+                    "wheat", "grains", "agriculture"],
+    "politics": ["elections", "election", "parliament", "congress", "campaign", "vote"],
+    "economy": ["inflation", "gdp", "recession", "jobs", "employment", "unemployment",
+                "growth", "wages"],
+    "business": ["mergers", "acquisitions", "earnings", "retail", "startups", "banking",
+                 "banks", "insurance"],
+    "tech": ["semiconductors", "chips", "software", "cybersecurity", "telecom", "ai"],
+}
+# Inflections stripped by stem(); names don't take these, so "Indian" and
+# "Indiana" keep different stems and are never merged
+STEM_SUFFIXES = (("ies", "y"), ("ings", ""), ("ing", ""), ("s", ""))
+MIN_STEM_LENGTH = 3
+
+# (label, label, whether they should land in the same bucket)
+REGRESSION_CASES = [
+    ("Banking", "Banks", True),
+    ("Oil Finance", "oil markets", True),
+    ("Energy - Oil", "Oil", True),
+    ("Semiconductors", "Semiconductor Industry", True),
+    ("Tech Companies", "Tech Company", True),
+    ("Indiana Elections", "Indian Elections", False),
+    ("US Politics", "UK Politics", False),
+    ("Oil", "Oil spill", False),
+    ("Politics - Elections", "Elections", True),
+    ("Tech Policy", "Energy Policy", False),
+    ("US Technology", "US Economy", False),
+    ("US Business", "US Economy", False),
+    ("China Economy", "China Tech", False),
+    ("Crude Oil", "Oil", True),
+    ("Oil Finance", "Oil & Gas Finance", True),
+    ("Stock Markets", "Equities", True),
+    ("Elections", "Indian Elections", False),
+]
+
+
+def is_excluded(label):
+    """True if a category label falls under one of the excluded topics."""
+    return bool(label) and EXCLUDED_CATEGORY_PATTERN.search(label) is not None
+
+
+def stem(token):
+    """Strip a plural or -ing ending ("banks", "banking" -> "bank")."""
+    if token.endswith("ss"):
+        return token
+    for suffix, replacement in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)] + replacement
+    return token
+
+
+# Every lookup below is on stems, so "politics" and "elections" are found as
+# "politic" and "election"
+_SYNONYM_STEMS = {stem(word): stem(target) for word, target in TERM_SYNONYMS.items()}
+_DOMAIN_STEMS = {
+    stem(domain): {stem(subject) for subject in subjects}
+    for domain, subjects in DOMAIN_SUBJECTS.items()
+}
+_SUBJECT_DOMAINS = defaultdict(set)
+for _domain, _subjects in _DOMAIN_STEMS.items():
+    for _subject in _subjects:
+        _SUBJECT_DOMAINS[_subject].add(_domain)
+
+
+def term(token):
+    """Stem of a word, with domain spellings reduced to one ("technology" -> "tech")."""
+    stemmed = stem(token)
+    return _SYNONYM_STEMS.get(stemmed, stemmed)
+
+
+def label_tokens(label):
+    """Significant, stemmed words of a label, without domains implied by a subject."""
+    tokens = {term(token) for token in normalise_text(label).split() if token not in GENERIC_TERMS}
+    redundant = {
+        token for token in tokens
+        if token in _DOMAIN_STEMS and tokens & _DOMAIN_STEMS[token]
+    }
+    return frozenset(tokens - redundant)
+
+
+def label_key(tokens):
+    return " ".join(sorted(tokens))
+
+
+def nests(a, b):
+    """
+    True if one stemmed token set extends the other only with sibling subjects.
+
+    "crude oil" extends "oil" with another energy subject, so the two nest.
+    "oil spill" doesn't: "spill" is no known subject, and neither is any name or
+    place, so "Indian Elections" never folds into "Elections".
+    """
+    if a == b or not (a <= b or b <= a):
+        return False
+    domains = set().union(*(_SUBJECT_DOMAINS.get(token, set()) for token in a & b))
+    return all(_SUBJECT_DOMAINS.get(token, set()) & domains for token in a ^ b)
+
+
+class CategoryTaxonomy:
+    def __init__(self, path=TAXONOMY_PATH, embedding_threshold=0.75, use_embeddings=None):
+        """
+        Load (or start) a taxonomy.
+
+        Args:
+            path (str): JSON file the taxonomy is kept in, or None to keep it in memory.
+            embedding_threshold (float): Minimum cosine similarity for embedding matches.
+            use_embeddings (bool): Use sentence-transformers for labels the word
+                matching can't place. Defaults to whether the package is installed.
+        """
+        self.path = path
+        self.embedding_threshold = embedding_threshold
+        if use_embeddings is None:
+            use_embeddings = find_spec("sentence_transformers") is not None
+        self.use_embeddings = use_embeddings
+
+        self.canonical = []
+        self.aliases = {}
+        self._cache = {}
+        self._canonical_tokens = []
+        self._token_index = defaultdict(set)
+        self._model = None
+        self._embeddings = None
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            for label in state.get("canonical", []):
+                self._add_canonical(label)
+            self.aliases.update(state.get("aliases", {}))
+
+    def _add_canonical(self, label):
+        index = len(self.canonical)
+        tokens = label_tokens(label)
+        self.canonical.append(label)
+        self._canonical_tokens.append(tokens)
+        self.aliases[label_key(tokens)] = label
+        for token in tokens:
+            self._token_index[token].add(index)
+        self._embeddings = None  # recomputed lazily with the new label
+        return label
+
+    def _nested_match(self, tokens):
+        # Only check labels sharing at least one stem, so cost stays flat as the taxonomy grows
+        candidates = set()
+        for token in tokens:
+            candidates |= self._token_index.get(token, set())
+
+        # The closest nesting label wins; ties go to the oldest
+        best_index, best_distance = None, None
+        for index in sorted(candidates):
+            other = self._canonical_tokens[index]
+            if nests(tokens, other):
+                distance = len(tokens ^ other)
+                if best_distance is None or distance < best_distance:
+                    best_index, best_distance = index, distance
+        return None if best_index is None else self.canonical[best_index]
+
+    def _embedding_match(self, label):
+        if not self.use_embeddings or not self.canonical:
+            return None
+        import numpy as np
+
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(EMBEDDING_MODEL)
+        if self._embeddings is None:
+            self._embeddings = self._model.encode(self.canonical, normalize_embeddings=True)
+
+        vector = self._model.encode([label], normalize_embeddings=True)[0]
+        scores = self._embeddings @ vector
+        best = int(np.argmax(scores))
+        return self.canonical[best] if scores[best] >= self.embedding_threshold else None
+
+    def canonicalise(self, raw_label):
+        """
+        Map a raw LLM category label onto its canonical bucket.
+
+        Args:
+            raw_label (str): Label as returned by the model.
+
+        Returns:
+            str: The canonical label (the raw label itself, tidied, if it starts a new bucket).
+        """
+        cached = self._cache.get(raw_label)
+        if cached is not None:
+            return cached
+
+        tokens = label_tokens(raw_label)
+        key = label_key(tokens)
+        label = self.aliases.get(key)
+
+        if label is None and tokens:
+            label = self._nested_match(tokens) or self._embedding_match(raw_label)
+            if label is None:
+                tidy = " ".join(raw_label.split())
+                label = self._add_canonical(tidy.title() if tidy.islower() else tidy)
+            self.aliases[key] = label
+        elif label is None:
+            label = "Uncategorised"
+
+        self._cache[raw_label] = label
+        return label
+
+    def save(self):
+        if not self.path:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"canonical": self.canonical, "aliases": self.aliases}, f, indent=2)
+
+
+def check_regression_cases():
+    """
+    Canonicalise every pair in REGRESSION_CASES with a fresh in-memory taxonomy.
+
+    Returns:
+        int: Number of pairs that were merged or kept apart wrongly.
+    """
+    mismatches = 0
+    for first, second, should_merge in REGRESSION_CASES:
+        taxonomy = CategoryTaxonomy(path=None, use_embeddings=False)
+        merged = taxonomy.canonicalise(first) == taxonomy.canonicalise(second)
+        if merged != should_merge:
+            mismatches += 1
+            print(f"MISMATCH {first!r} / {second!r}: "
+                  f"{'merged' if merged else 'kept apart'}, expected the opposite")
+
+    print(f"{len(REGRESSION_CASES) - mismatches}/{len(REGRESSION_CASES)} label pairs bucketed as expected")
+    return mismatches
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if check_regression_cases() else 0)
@@ -0,0 +1,442 @@
+"""
+Local HTTP service for the digests saved by the pipeline (see interaction.save_digest).
+
+Serves the latest and historical digests, category breakdowns, cluster details
+and a headline search as JSON and HTML. It is meant as the shared team view in
+place of the desktop HeadlineViewer.
+
+Every view of a digest is rendered once, when the digest is loaded, into bytes
+with an ETag and a pre-gzipped copy, so a request is a dictionary lookup and a
+socket write. The newest digest is held in memory and picked up automatically
+when the pipeline writes a new one; older days are kept in a small LRU cache.
+
+Usage:
+    python web_service.py --host 127.0.0.1 --port 8080
+
+Routes:
+    GET /                                          latest digest (HTML)
+    GET /digests                                   list of days (HTML)
+    GET /digests/<day|latest>                      digest (HTML)
+    GET /digests/<day|latest>/categories/<name>    one category (HTML)
+    GET /api/digests                               list of days
+    GET /api/digests/<day|latest>                  digest
+    GET /api/digests/<day|latest>/categories       category names and counts
+    GET /api/digests/<day|latest>/categories/<name>
+    GET /api/digests/<day|latest>/clusters         cluster names and sizes
+    GET /api/digests/<day|latest>/clusters/<name>
+    GET /api/search?q=<words>[&day=<day>]          headlines containing every word
+    GET /healthz
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict, defaultdict
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from interaction import DIGEST_DIR, generate_html_report
+from text_normalisation import normalise_text
+
+DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MIN_GZIP_SIZE = 512
+KEEP_ALIVE_TIMEOUT = 15
+# No route takes a request body; small ones are read and discarded, anything else is refused
+MAX_BODY_SIZE = 1024
+BODY_TIMEOUT = 5
+RESCAN_INTERVAL = 5.0
+HISTORY_CACHE_SIZE = 30
+SEARCH_CACHE_SIZE = 256
+MAX_SEARCH_RESULTS = 50
+
+LATEST_CACHE_CONTROL = "public, max-age=60"
+HISTORY_CACHE_CONTROL = "public, max-age=86400"
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large", 501: "Not Implemented"}
+
+
+class Response:
+    def __init__(self, body, content_type="application/json", status=200,
+                 cache_control="no-cache"):
+        """
+        A fully rendered response body, with its ETag and gzipped copy computed up front.
+
+        Args:
+            body (str or bytes): Response body.
+            content_type (str): MIME type (utf-8 charset is added).
+            status (int): HTTP status code.
+            cache_control (str): Cache-Control header value.
+        """
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.content_type = f"{content_type}; charset=utf-8"
+        self.status = status
+        self.cache_control = cache_control
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+        self.gzipped = gzip.compress(self.body, 6) if len(self.body) >= MIN_GZIP_SIZE else None
+        self._wire = {}
+
+    def wire(self, use_gzip, keep_alive, head_only=False):
+        """Serialised status line, headers and body (memoised per variant)."""
+        key = (use_gzip, keep_alive, head_only)
+        cached = self._wire.get(key)
+        if cached is not None:
+            return cached
+
+        body = self.gzipped if use_gzip else self.body
+        headers = [
+            f"HTTP/1.1 {self.status} {STATUS_TEXT.get(self.status, '')}",
+            f"Content-Type: {self.content_type}",
+            f"Content-Length: {len(body)}",
+            f"ETag: {self.etag}",
+            f"Cache-Control: {self.cache_control}",
+            "Vary: Accept-Encoding",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if use_gzip:
+            headers.append("Content-Encoding: gzip")
+        head = ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1")
+
+        wire = head if head_only else head + body
+        self._wire[key] = wire
+        return wire
+
+    def not_modified(self, keep_alive):
+        return (
+            f"HTTP/1.1 304 Not Modified\r\nETag: {self.etag}\r\n"
+            f"Cache-Control: {self.cache_control}\r\nVary: Accept-Encoding\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+
+
+def json_response(data, status=200, cache_control="no-cache"):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return Response(body, "application/json", status, cache_control)
+
+
+def html_response(body, status=200, cache_control="no-cache"):
+    return Response(body, "text/html", status, cache_control)
+
+
+def error_response(status, message):
+    return json_response({"error": message}, status)
+
+
+NOT_FOUND = error_response(404, "Not found")
+BAD_REQUEST = error_response(400, "Bad request")
+METHOD_NOT_ALLOWED = error_response(405, "Only GET and HEAD are supported")
+PAYLOAD_TOO_LARGE = error_response(413, "Request bodies are not accepted")
+CHUNKED_NOT_SUPPORTED = error_response(501, "Transfer-Encoding is not supported")
+HEALTHY = json_response({"status": "ok"})
+
+
+class PreparedDigest:
+    def __init__(self, digest, cache_control):
+        """
+        Render every view of one day's digest.
+
+        Args:
+            digest (dict): Digest as written by interaction.save_digest.
+            cache_control (str): Cache-Control header for this day's responses.
+        """
+        self.day = digest["day"]
+        self.cache_control = cache_control
+        entries = digest.get("entries", [])
+        rows = [(e["category"], e["headline"], e["summary"]) for e in entries]
+
+        by_category = defaultdict(list)
+        for entry in entries:
+            by_category[entry["category"]].append(entry)
+        if digest.get("ranked"):
+            categories = list(by_category)
+        else:
+            categories = sorted(by_category, key=lambda c: len(by_category[c]), reverse=True)
+        clusters = digest.get("clusters", {})
+
+        self.digest = json_response({
+            "day": self.day,
+            "generated_at": digest.get("generated_at"),
+            "categories": [{"name": c, "entries": by_category[c]} for c in categories],
+        }, cache_control=cache_control)
+        self.html = html_response(generate_html_report(rows, ranked=digest.get("ranked", False)),
+                                  cache_control=cache_control)
+        self.categories = json_response({
+            "day": self.day,
+            "categories": [{"name": c, "count": len(by_category[c]),
+                            "url": f"/api/digests/{self.day}/categories/{quote(c, safe='')}"}
+                           for c in categories],
+        }, cache_control=cache_control)
+        self.category_json = {
+            c: json_response({"day": self.day, "name": c, "entries": by_category[c]},
+                             cache_control=cache_control)
+            for c in categories
+        }
+        self.category_html = {
+            c: html_response(generate_html_report(
+                [(c, e["headline"], e["summary"]) for e in by_category[c]]), cache_control=cache_control)
+            for c in categories
+        }
+        self.clusters = json_response({
+            "day": self.day,
+            "clusters": [{"name": name, "size": len(titles)} for name, titles in clusters.items()],
+        }, cache_control=cache_control)
+        self.cluster_json = {
+            name: json_response({"day": self.day, "name": name, "titles": titles},
+                                cache_control=cache_control)
+            for name, titles in clusters.items()
+        }
+
+        self._search_index = [
+            (f" {normalise_text(e['headline'])} {normalise_text(e['summary'])} ", e) for e in entries
+        ]
+        self._search_cache = OrderedDict()
+
+    def search(self, query):
+        """Entries whose headline or summary contains every word of the query."""
+        terms = normalise_text(query).split()
+        key = " ".join(terms)
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            self._search_cache.move_to_end(key)
+            return cached
+
+        padded = [f" {term} " for term in terms]
+        matches = [entry for text, entry in self._search_index if all(t in text for t in padded)]
+        response = json_response({
+            "day": self.day, "query": query, "total": len(matches),
+            "results": matches[:MAX_SEARCH_RESULTS],
+        }, cache_control=self.cache_control)
+
+        self._search_cache[key] = response
+        if len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        return response
+
+
+class DigestStore:
+    def __init__(self, digest_dir=DIGEST_DIR):
+        """Loads digests from `digest_dir`, keeping the newest always in memory."""
+        self.digest_dir = digest_dir
+        self.latest = None
+        self.index_json = json_response({"days": []})
+        self.index_html = html_response(self._index_html([]))
+        self._history = OrderedDict()
+        self._latest_signature = None
+        self._last_scan = 0.0
+        self.rescan()
+
+    def _load(self, day, cache_control):
+        path = os.path.join(self.digest_dir, f"{day}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return PreparedDigest(json.load(f), cache_control)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load digest {day}: {e}")
+            return None
+
+    def _index_html(self, days):
+        links = "".join(f"<li><a href='/digests/{d}'>{d}</a></li>" for d in days)
+        return f"<html><body><h1>Digests</h1><ul>{links}</ul></body></html>"
+
+    def rescan(self):
+        """Pick up new digests written by the pipeline (at most every RESCAN_INTERVAL seconds)."""
+        now = time.monotonic()
+        if now - self._last_scan < RESCAN_INTERVAL:
+            return
+        self._last_scan = now
+
+        try:
+            days = sorted(
+                (name[:-len(".json")] for name in os.listdir(self.digest_dir)
+                 if name.endswith(".json") and DAY_PATTERN.match(name[:-len(".json")])),
+                reverse=True,
+            )
+        except OSError:
+            days = []
+
+        signature = None
+        if days:
+            newest = os.path.join(self.digest_dir, f"{days[0]}.json")
+            try:
+                signature = (days[0], os.stat(newest).st_mtime_ns, len(days))
+            except OSError:
+                pass
+
+        if signature != self._latest_signature:
+            self._latest_signature = signature
+            self.latest = self._load(days[0], LATEST_CACHE_CONTROL) if days else None
+            self.index_json = json_response({"days": days})
+            self.index_html = html_response(self._index_html(days))
+            # The previous latest day may now be served from history with long-lived caching
+            self._history.pop(days[0] if days else None, None)
+
+    def get(self, day):
+        """The PreparedDigest for a day ('latest' or YYYY-MM-DD), or None."""
+        self.rescan()
+        if day == "latest" or (self.latest and day == self.latest.day):
+            return self.latest
+        if not DAY_PATTERN.match(day):
+            return None
+
+        prepared = self._history.get(day)
+        if prepared is not None:
+            self._history.move_to_end(day)
+            return prepared
+
+        prepared = self._load(day, HISTORY_CACHE_CONTROL)
+        if prepared is not None:
+            self._history[day] = prepared
+            if len(self._history) > HISTORY_CACHE_SIZE:
+                self._history.popitem(last=False)
+        return prepared
+
+
+class DigestServer:
+    def __init__(self, store):
+        self.store = store
+
+    def route(self, target):
+        """Map a request target to a Response."""
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+
+        if not parts:
+            digest = self.store.get("latest")
+            return digest.html if digest else NOT_FOUND
+        if parts == ["healthz"]:
+            return HEALTHY
+
+        if parts[0] == "api":
+            if parts[1:] == ["digests"]:
+                self.store.rescan()
+                return self.store.index_json
+            if parts[1:] == ["search"]:
+                query = parse_qs(url.query)
+                if not query.get("q"):
+                    return BAD_REQUEST
+                digest = self.store.get(query.get("day", ["latest"])[0])
+                return digest.search(query["q"][0]) if digest else NOT_FOUND
+            if len(parts) >= 3 and parts[1] == "digests":
+                digest = self.store.get(parts[2])
+                if digest is None:
+                    return NOT_FOUND
+                rest = parts[3:]
+                if not rest:
+                    return digest.digest
+                if rest == ["categories"]:
+                    return digest.categories
+                if rest == ["clusters"]:
+                    return digest.clusters
+                if len(rest) == 2 and rest[0] == "categories":
+                    return digest.category_json.get(rest[1], NOT_FOUND)
+                if len(rest) == 2 and rest[0] == "clusters":
+                    return digest.cluster_json.get(rest[1], NOT_FOUND)
+            return NOT_FOUND
+
+        if parts[0] == "digests":
+            if len(parts) == 1:
+                self.store.rescan()
+                return self.store.index_html
+            digest = self.store.get(parts[1])
+            if digest is None:
+                return NOT_FOUND
+            if len(parts) == 2:
+                return digest.html
+            if len(parts) == 4 and parts[2] == "categories":
+                return digest.category_html.get(parts[3], NOT_FOUND)
+
+        return NOT_FOUND
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    writer.write(BAD_REQUEST.wire(False, False))
+                    break
+
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                # A body we can't skip exactly would desync the next request on this
+                # connection, so those requests get an error and the connection is closed
+                length = headers.get("content-length", "0")
+                if "transfer-encoding" in headers:
+                    writer.write(CHUNKED_NOT_SUPPORTED.wire(False, False))
+                    break
+                if not length.isdigit():
+                    writer.write(BAD_REQUEST.wire(False, False))
+                    break
+                if int(length) > MAX_BODY_SIZE:
+                    writer.write(PAYLOAD_TOO_LARGE.wire(False, False))
+                    break
+                if int(length):
+                    try:
+                        await asyncio.wait_for(reader.readexactly(int(length)), BODY_TIMEOUT)
+                    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                        break
+
+                if method not in ("GET", "HEAD"):
+                    response = METHOD_NOT_ALLOWED
+                else:
+                    response = self.route(target)
+
+                etags = headers.get("if-none-match")
+                if etags and response.status == 200 and response.etag in etags.split(", "):
+                    writer.write(response.not_modified(keep_alive))
+                else:
+                    use_gzip = response.gzipped is not None and "gzip" in headers.get("accept-encoding", "")
+                    writer.write(response.wire(use_gzip, keep_alive, method == "HEAD"))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8080, digest_dir=DIGEST_DIR):
+    store = DigestStore(digest_dir)
+    server = DigestServer(store)
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port, backlog=1024)
+
+    latest = store.latest.day if store.latest else "none yet"
+    print(f"Serving digests from {digest_dir} on http://{host}:{port} (latest: {latest})")
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve saved news digests over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--digest-dir", default=DIGEST_DIR)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.digest_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()